@@ -0,0 +1,39 @@
+""""""
+
+# Standard library modules.
+import os
+
+# Third party modules.
+import pytest
+
+# Local modules.
+
+# Globals and constants variables.
+COLLECT_ENVVAR = "DJANGO_CD_PYTEST_COLLECT"
+SELECT_ENVVAR = "DJANGO_CD_PYTEST_SELECT"
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config, items):
+    filepath = os.environ.get(COLLECT_ENVVAR)
+    if filepath:
+        with open(filepath, "w", encoding="utf8") as fp:
+            for item in items:
+                fp.write(item.nodeid + "\n")
+
+    filepath = os.environ.get(SELECT_ENVVAR)
+    if filepath:
+        with open(filepath, "r", encoding="utf8") as fp:
+            nodeids = set(fp.read().splitlines())
+
+        selected = []
+        deselected = []
+        for item in items:
+            if item.nodeid in nodeids:
+                selected.append(item)
+            else:
+                deselected.append(item)
+
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
@@ -2,32 +2,216 @@
 
 # Standard library modules.
 import abc
+import codecs
+import concurrent.futures
 import datetime
+import functools
+import hashlib
+import heapq
+import os
 from pathlib import Path
+import select
 import shlex
+import shutil
+import statistics
 import subprocess
 import time
 import sys
 import venv
 import tempfile
 import string
+import contextlib
+import contextvars
+import threading
 import xml.etree.ElementTree as ElementTree
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
 # Third party modules.
 import yarl
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
 from loguru import logger
 
 # Local modules.
-from .models import ActionRun, RunState, TestResult
+from ._pytest_plugin import COLLECT_ENVVAR, SELECT_ENVVAR
+from . import metrics
+from .models import (
+    TEST_COUNTER_FIELDS,
+    ActionRun,
+    ActionSpan,
+    Artifact,
+    OutputChunk,
+    RunState,
+    TestResult,
+)
 
 # Globals and constants variables.
+READ_SIZE = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+FLUSH_INTERVAL = 1.0
+BULK_SIZE = 1000
+LS_REMOTE_TTL = 60.0
+
+_ls_remote_cache = {}
+_ls_remote_locks = {}
+_ls_remote_lock = threading.Lock()
+
+_resource_usage = contextvars.ContextVar("resource_usage", default=None)
+
+
+class ActionOutput:
+    def __init__(self, actionrun, chunk_size=CHUNK_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.actionrun = actionrun
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+
+        self._buffer = []
+        self._buffer_size = 0
+        self._offset = 0
+        self._newline = True
+        self._last_flush_time = time.monotonic()
+
+    def write(self, text):
+        if not text:
+            return
+
+        self._buffer.append(text)
+        self._buffer_size += len(text)
+        self._newline = text.endswith("\n")
+
+        if (
+            self._buffer_size >= self.chunk_size
+            or time.monotonic() - self._last_flush_time >= self.flush_interval
+        ):
+            self.flush()
+
+    def append(self, line):
+        if not self._newline:
+            line = "\n" + line
+        self.write(line + "\n")
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def poll(self):
+        # Flush buffered text while the process is silent
+        elapsed = time.monotonic() - self._last_flush_time
+        if elapsed >= self.flush_interval:
+            self.flush()
+            return self.flush_interval
+        return self.flush_interval - elapsed
+
+    def flush(self):
+        self._last_flush_time = time.monotonic()
+        if not self._buffer:
+            return
+
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffer_size = 0
+
+        OutputChunk.objects.create(
+            actionrun=self.actionrun, offset=self._offset, text=text
+        )
+        self._offset += len(text)
+
+
+class ResourceUsage:
+    def __init__(self):
+        self.nprocesses = 0
+        self.user_time = 0.0
+        self.system_time = 0.0
+        self.max_rss = 0
+        self.read_blocks = 0
+        self.write_blocks = 0
+        self.voluntary_switches = 0
+        self.involuntary_switches = 0
+
+        self._lock = threading.Lock()
+
+    def add(self, rusage):
+        # Linux reports max RSS in kilobytes, macOS in bytes
+        max_rss = rusage.ru_maxrss
+        if sys.platform != "darwin":
+            max_rss *= 1024
+
+        with self._lock:
+            self.nprocesses += 1
+            self.user_time += rusage.ru_utime
+            self.system_time += rusage.ru_stime
+            self.max_rss = max(self.max_rss, max_rss)
+            self.read_blocks += rusage.ru_inblock
+            self.write_blocks += rusage.ru_oublock
+            self.voluntary_switches += rusage.ru_nvcsw
+            self.involuntary_switches += rusage.ru_nivcsw
+
+    def save(self, actionrun):
+        if not self.nprocesses:
+            return []
+
+        actionrun.cpu_user_time = datetime.timedelta(seconds=self.user_time)
+        actionrun.cpu_system_time = datetime.timedelta(seconds=self.system_time)
+        actionrun.max_rss = self.max_rss
+        actionrun.io_read_blocks = self.read_blocks
+        actionrun.io_write_blocks = self.write_blocks
+        actionrun.voluntary_context_switches = self.voluntary_switches
+        actionrun.involuntary_context_switches = self.involuntary_switches
+        return [
+            "cpu_user_time",
+            "cpu_system_time",
+            "max_rss",
+            "io_read_blocks",
+            "io_write_blocks",
+            "voluntary_context_switches",
+            "involuntary_context_switches",
+        ]
+
+
+class ShardOutput:
+    def __init__(self, outputs, prefix, lock):
+        self.outputs = outputs
+        self.prefix = prefix
+        self.lock = lock
+        self._partial = ""
+
+    def write(self, text):
+        # Only complete lines, so shards do not interleave within a line
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        if not lines:
+            return
+
+        with self.lock:
+            self.outputs.write("".join(f"[{self.prefix}] {line}\n" for line in lines))
+
+    def append(self, line):
+        self.write(line + "\n")
+
+    def poll(self):
+        with self.lock:
+            return self.outputs.poll()
+
+    def flush(self):
+        if self._partial:
+            self.write("\n")
 
 
 class Action(metaclass=abc.ABCMeta):
     def __init__(self, name, relpath=""):
         self.name = name
         self.relpath = relpath
+        self.needs = None
+        self.inputs = None
+        self.artifacts = None
         self._actionrun = None
+        self._spans = []
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__}({self.name})>"
@@ -40,6 +224,7 @@ class Action(metaclass=abc.ABCMeta):
         self._actionrun = ActionRun.objects.create(
             name=self.name, jobrun=jobrun, state=RunState.RUNNING
         )
+        self._spans = []
 
         # Update env
         workdir = Path(workdir).joinpath(self.relpath)
@@ -49,65 +234,396 @@ class Action(metaclass=abc.ABCMeta):
 
         # Start
         start_time = time.time()
-        outputs = []
+        outputs = ActionOutput(self._actionrun)
+        usage = ResourceUsage()
+        token = _resource_usage.set(usage)
 
         try:
-            state = self._run(workdir, outputs, env)
+            cached_actionrun = self._find_cached_actionrun(jobrun, workdir, env)
+            if cached_actionrun is not None:
+                outputs.append(
+                    f"Inputs unchanged, reusing action run #{cached_actionrun.id}"
+                )
+                self._actionrun.cached_from = cached_actionrun
+                self._reuse_artifacts(cached_actionrun, workdir, outputs)
+
+                # Replay changes of the cached run to env
+                self._actionrun.revision = cached_actionrun.revision
+                self._actionrun.env = cached_actionrun.env
+                env.update(cached_actionrun.env)
+                state = RunState.SUCCESS
+            else:
+                previous_env = dict(env)
+                state = self._run(workdir, outputs, env)
+                self._actionrun.env = dict(
+                    (key, str(value))
+                    for key, value in env.items()
+                    if previous_env.get(key) != value
+                )
+
+            if (
+                state == RunState.SUCCESS
+                and self.artifacts
+                and cached_actionrun is None
+            ):
+                self._store_artifacts(workdir, outputs)
 
         except Exception as ex:
             logger.exception(f"While running action {self.name}")
             state = RunState.ERROR
             outputs.append(str(ex))
 
+        finally:
+            _resource_usage.reset(token)
+
         # Save ActionRun
         end_time = time.time()
+        outputs.flush()
         self._actionrun.state = state
-        self._actionrun.output = "\n".join(outputs)
         self._actionrun.duration = datetime.timedelta(seconds=end_time - start_time)
-        self._actionrun.save(update_fields=["duration", "state", "output"])
+        self._actionrun.save(
+            update_fields=[
+                "duration",
+                "state",
+                "revision",
+                "inputs_hash",
+                "cached_from",
+                "env",
+            ]
+            + usage.save(self._actionrun)
+        )
+        ActionSpan.objects.bulk_create(self._spans)
+
+        # Update metrics
+        labels = {"job": jobrun.name, "action": self.name}
+        metrics.inc(metrics.ACTION_RUNS, dict(labels, state=state))
+        metrics.observe(
+            metrics.ACTION_DURATION, self._actionrun.duration.total_seconds(), labels
+        )
 
         return state
 
+    @contextlib.contextmanager
+    def span(self, name):
+        started_on = timezone.now()
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            # Saved with the action run, spans can be recorded from any thread
+            if self._actionrun is not None:
+                duration = datetime.timedelta(seconds=time.time() - start_time)
+                self._spans.append(
+                    ActionSpan(
+                        actionrun=self._actionrun,
+                        name=name,
+                        started_on=started_on,
+                        duration=duration,
+                    )
+                )
+
+    def _hash_inputs(self, workdir, env):
+        hasher = hashlib.sha256()
+
+        # Configuration
+        config = sorted(
+            (key, repr(value))
+            for key, value in vars(self).items()
+            if not key.startswith("_")
+        )
+        hasher.update(f"{self.__class__.__name__}{config}".encode("utf8"))
+
+        # Files
+        for pattern in self.inputs.get("files", []):
+            for filepath in sorted(workdir.glob(pattern)):
+                if not filepath.is_file():
+                    continue
+                hasher.update(str(filepath.relative_to(workdir)).encode("utf8"))
+                _hash_file(hasher, filepath)
+
+        # Environment
+        for key in self.inputs.get("env", []):
+            hasher.update(f"{key}={env.get(key)}".encode("utf8"))
+
+        return hasher.hexdigest()
+
+    def _store_artifacts(self, workdir, outputs):
+        artifacts = []
+        for pattern in self.artifacts:
+            for filepath in sorted(workdir.glob(pattern)):
+                if not filepath.is_file():
+                    continue
+
+                digest, size = store_artifact(filepath)
+                artifacts.append(
+                    Artifact(
+                        actionrun=self._actionrun,
+                        path=filepath.relative_to(workdir).as_posix(),
+                        digest=digest,
+                        size=size,
+                    )
+                )
+
+        Artifact.objects.bulk_create(artifacts, batch_size=BULK_SIZE)
+        outputs.append(f"Stored {len(artifacts)} artifact(s)")
+
+    def _reuse_artifacts(self, actionrun, workdir, outputs):
+        # Already stored, only the rows are copied
+        artifacts = link_artifacts(actionrun, workdir)
+        Artifact.objects.bulk_create(
+            [
+                Artifact(
+                    actionrun=self._actionrun,
+                    path=artifact.path,
+                    digest=artifact.digest,
+                    size=artifact.size,
+                )
+                for artifact in artifacts
+            ],
+            batch_size=BULK_SIZE,
+        )
+        if artifacts:
+            outputs.append(f"Reused {len(artifacts)} artifact(s)")
+
+    def _find_cached_actionrun(self, jobrun, workdir, env):
+        if self.inputs is None:
+            return None
+
+        self._actionrun.inputs_hash = self._hash_inputs(workdir, env)
+
+        actionrun = (
+            ActionRun.objects.filter(
+                name=self.name,
+                jobrun__name=jobrun.name,
+                inputs_hash=self._actionrun.inputs_hash,
+                state=RunState.SUCCESS,
+            )
+            .exclude(pk=self._actionrun.pk)
+            .order_by("-started_on")
+            .first()
+        )
+        if actionrun is None:
+            return None
+
+        if actionrun.cached_from_id is not None:
+            return actionrun.cached_from
+        return actionrun
+
     @abc.abstractmethod
     def _run(self, workdir, outputs, env):
         raise NotImplementedError
 
+    def upstream_revision(self):
+        return None
+
     def add_testresult(self, name, state, duration, output):
-        if self._actionrun is None:
+        self.add_testresults([(name, state, duration, output)])
+
+    def add_testresults(self, testresults):
+        if self._actionrun is None or not testresults:
             return
-        TestResult.objects.create(
-            name=name,
-            actionrun=self._actionrun,
-            state=state,
-            duration=duration,
-            output=output,
+        TestResult.objects.bulk_create(
+            [
+                TestResult(
+                    name=name,
+                    actionrun=self._actionrun,
+                    state=state,
+                    duration=duration,
+                    output=output,
+                )
+                for name, state, duration, output in testresults
+            ],
+            batch_size=BULK_SIZE,
+        )
+
+        # Update counters
+        counters = dict((field, 0) for field in TEST_COUNTER_FIELDS.values())
+        total_duration = datetime.timedelta(0)
+        for _name, state, duration, _output in testresults:
+            if state in TEST_COUNTER_FIELDS:
+                counters[TEST_COUNTER_FIELDS[state]] += 1
+            total_duration += duration
+
+        for field, count in counters.items():
+            setattr(self._actionrun, field, getattr(self._actionrun, field) + count)
+        self._actionrun.tests_duration += total_duration
+
+        ActionRun.objects.filter(pk=self._actionrun.pk).update(
+            tests_duration=F("tests_duration") + total_duration,
+            **dict((field, F(field) + count) for field, count in counters.items()),
         )
 
 
-def _run_command(args, cwd, outputs, env, shell=False):
+def _get_cachedir(name):
+    cachedir = getattr(settings, "CACHEDIR", None)
+    if cachedir is None:
+        cachedir = Path(tempfile.gettempdir(), "django-cd")
+
+    cachedir = Path(cachedir, name)
+    cachedir.mkdir(parents=True, exist_ok=True)
+    return cachedir
+
+
+def _hash_file(hasher, filepath):
+    with open(filepath, "rb") as fp:
+        for data in iter(functools.partial(fp.read, READ_SIZE), b""):
+            hasher.update(data)
+
+
+@contextlib.contextmanager
+def _lock(filepath):
+    with open(filepath, "a") as fp:
+        if fcntl is not None:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def get_artifact_filepath(digest):
+    return _get_cachedir("artifacts").joinpath(digest[:2], digest)
+
+
+def store_artifact(filepath):
+    storedir = _get_cachedir("artifacts")
+
+    # Hash while copying to avoid reading the file twice
+    hasher = hashlib.sha256()
+    size = 0
+    with open(filepath, "rb") as src, tempfile.NamedTemporaryFile(
+        dir=storedir, delete=False
+    ) as dst:
+        for data in iter(functools.partial(src.read, READ_SIZE), b""):
+            hasher.update(data)
+            dst.write(data)
+            size += len(data)
+
+    digest = hasher.hexdigest()
+    blob_filepath = get_artifact_filepath(digest)
+
+    if blob_filepath.exists():
+        os.unlink(dst.name)
+    else:
+        blob_filepath.parent.mkdir(exist_ok=True)
+        os.chmod(dst.name, 0o444)
+        os.replace(dst.name, blob_filepath)
+
+    return digest, size
+
+
+def link_artifacts(actionrun, workdir):
+    artifacts = list(actionrun.artifacts.all())
+    for artifact in artifacts:
+        filepath = Path(workdir, artifact.path)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        if filepath.exists():
+            filepath.unlink()
+        _link_or_copy(get_artifact_filepath(artifact.digest), filepath)
+
+    return artifacts
+
+
+def _ls_remote(url):
+    with _ls_remote_lock:
+        lock = _ls_remote_locks.setdefault(url, threading.Lock())
+
+    # Jobs checking the same repository share a single call
+    with lock:
+        cached = _ls_remote_cache.get(url)
+        if cached is not None and time.monotonic() - cached[0] < LS_REMOTE_TTL:
+            return cached[1]
+
+        refs = {}
+        try:
+            process = subprocess.run(
+                ["git", "ls-remote", "--heads", "--tags", url],
+                capture_output=True,
+                timeout=LS_REMOTE_TTL,
+            )
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Timeout while listing references of {url}")
+        else:
+            for line in process.stdout.decode("utf8").splitlines():
+                revision, _, ref = line.partition("\t")
+                refs[ref] = revision
+
+        _ls_remote_cache[url] = (time.monotonic(), refs)
+        return refs
+
+
+def _wait(process):
+    usage = _resource_usage.get()
+    if usage is None or not hasattr(os, "wait4"):
+        return process.wait()
+
+    # Reap the process ourselves to get the usage of its whole tree
+    _pid, status, rusage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+
+    usage.add(rusage)
+    return process.returncode
+
+
+def _read_pipe(pipe, outputs):
+    # Pipes cannot be polled on Windows
+    if sys.platform == "win32":
+        yield from iter(functools.partial(pipe.read1, READ_SIZE), b"")
+        return
+
+    fd = pipe.fileno()
+    while True:
+        ready, _, _ = select.select([fd], [], [], outputs.poll())
+        if not ready:
+            continue
+
+        data = os.read(fd, READ_SIZE)
+        if not data:
+            return
+        yield data
+
+
+def _run_command(args, cwd, outputs, env, shell=False, environ=None):
     # Interpolate args
     args = [string.Template(arg).substitute(env) for arg in args]
 
     # Run
     outputs.append(f'> {" ".join(args)}')
-    process = subprocess.run(
+    process = subprocess.Popen(
         args,
         shell=shell,
-        capture_output=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
         cwd=cwd,
+        env=environ,
     )
 
-    # Update outputs
-    outputs += process.stdout.decode("utf8").splitlines()
-    outputs += process.stderr.decode("utf8").splitlines()
+    # Stream outputs
+    decoder = codecs.getincrementaldecoder("utf8")(errors="replace")
+    with process:
+        for data in _read_pipe(process.stdout, outputs):
+            outputs.write(decoder.decode(data))
+        outputs.write(decoder.decode(b"", final=True))
+        _wait(process)
 
     return RunState.SUCCESS if process.returncode == 0 else RunState.FAILED
 
 
-def _run_python_command(args, cwd, outputs, env):
+def _run_python_command(args, cwd, outputs, env, environ=None):
     python_exe = env.get("PYTHON_EXE", sys.executable)
     args = [python_exe] + list(args)
-    return _run_command(args, cwd, outputs, env, shell=False)
+    return _run_command(args, cwd, outputs, env, shell=False, environ=environ)
 
 
 class CommandAction(Action):
@@ -121,7 +637,18 @@ class CommandAction(Action):
 
 
 class GitCheckoutAction(Action):
-    def __init__(self, name, repos_url, branch="master", relpath=""):
+    def __init__(
+        self,
+        name,
+        repos_url,
+        branch="master",
+        relpath="",
+        mirror=False,
+        dissolve=False,
+        depth=None,
+        filter=None,
+        single_branch=False,
+    ):
         super().__init__(name, relpath)
         self.repos_url = yarl.URL(repos_url)
 
@@ -129,52 +656,237 @@ class GitCheckoutAction(Action):
         self.repos_name = self.repos_name.rsplit(".")[0]
 
         self.branch = branch
+        self.mirror = mirror
+        self.dissolve = dissolve
+        self.depth = depth
+        self.filter = filter
+        self.single_branch = single_branch
 
     def _run(self, workdir, outputs, env):
         reposdir = workdir.joinpath(self.repos_name)
 
+        # Update mirror
+        if self.mirror:
+            mirrordir = self._mirrordir()
+            with self.span("mirror"):
+                state = self._update_mirror(mirrordir, outputs, env)
+            if state != state.SUCCESS:
+                return state
+
         # Clone
         if not reposdir.joinpath(".git").exists():
-            args = ["git", "clone", str(self.repos_url)]
-            state = _run_command(args, workdir, outputs, env, shell=False)
+            args = ["git", "clone"]
+            if self.mirror:
+                args += ["--reference", str(mirrordir)]
+                if self.dissolve:
+                    args += ["--dissolve"]
+            if self.depth is not None:
+                args += ["--depth", str(self.depth)]
+            if self.filter is not None:
+                args += [f"--filter={self.filter}"]
+            if self.single_branch:
+                args += ["--single-branch", "--branch", self.branch]
+            args += [str(self.repos_url)]
+
+            with self.span("clone"):
+                state = _run_command(args, workdir, outputs, env, shell=False)
             if state != state.SUCCESS:
                 return state
 
         # Clean
         args = ["git", "clean", "-xdf"]
-        state = _run_command(args, reposdir, outputs, env, shell=False)
+        with self.span("clean"):
+            state = _run_command(args, reposdir, outputs, env, shell=False)
         if state != state.SUCCESS:
             return state
 
         # Checkout
         args = ["git", "checkout", self.branch]
-        state = _run_command(args, reposdir, outputs, env, shell=False)
+        with self.span("checkout"):
+            state = _run_command(args, reposdir, outputs, env, shell=False)
         if state != state.SUCCESS:
             return state
 
         # Pull
         args = ["git", "pull"]
-        state = _run_command(args, reposdir, outputs, env, shell=False)
+        with self.span("pull"):
+            state = _run_command(args, reposdir, outputs, env, shell=False)
+        if state != state.SUCCESS:
+            return state
+
+        # Record revision
+        process = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=reposdir, capture_output=True
+        )
+        if process.returncode == 0:
+            revision = process.stdout.decode("utf8").strip()
+            self._actionrun.revision = revision
+            env["revision"] = revision
 
         return state
 
+    def upstream_revision(self):
+        refs = _ls_remote(str(self.repos_url))
+        return refs.get(f"refs/heads/{self.branch}") or refs.get(
+            f"refs/tags/{self.branch}"
+        )
+
+    def _mirrordir(self):
+        digest = hashlib.sha256(str(self.repos_url).encode("utf8")).hexdigest()
+        return _get_cachedir("git").joinpath(f"{self.repos_name}-{digest[:16]}.git")
+
+    def _update_mirror(self, mirrordir, outputs, env):
+        with _lock(mirrordir.with_suffix(".lock")):
+            # Fetch
+            if mirrordir.exists():
+                args = ["git", "fetch", "--prune", "origin"]
+                return _run_command(args, mirrordir, outputs, env, shell=False)
+
+            # Clone
+            builddir = Path(tempfile.mkdtemp(dir=mirrordir.parent))
+            args = ["git", "clone", "--mirror", str(self.repos_url), str(builddir)]
+            state = _run_command(args, mirrordir.parent, outputs, env, shell=False)
+            if state != RunState.SUCCESS:
+                shutil.rmtree(builddir, ignore_errors=True)
+                return state
+
+            # Objects are shared with checkouts, never prune them
+            args = ["git", "config", "gc.pruneExpire", "never"]
+            state = _run_command(args, builddir, outputs, env, shell=False)
+            if state != RunState.SUCCESS:
+                shutil.rmtree(builddir, ignore_errors=True)
+                return state
+
+            builddir.rename(mirrordir)
+            return state
+
 
 class PythonVirtualEnvAction(Action):
+    PACKAGES = ("pip", "setuptools", "wheel")
+
+    def __init__(self, name, relpath="", requirements=None, cache=False):
+        super().__init__(name, relpath)
+
+        if requirements is None:
+            requirements = []
+        self.requirements = tuple(requirements)
+
+        self.cache = cache
+
     def _run(self, workdir, outputs, env):
+        requirements = [
+            Path(
+                os.path.normpath(
+                    workdir.joinpath(string.Template(filepath).substitute(env))
+                )
+            )
+            for filepath in self.requirements
+        ]
+
+        if not self.cache:
+            return self._create(workdir, requirements, outputs, env)
+
+        # Build environment in cache, if needed
+        key = self._cache_key(requirements)
+        cachedir = _get_cachedir("venv").joinpath(key)
+
+        if cachedir.exists():
+            outputs.append(f"Using cached environment {key}")
+        else:
+            outputs.append(f"Creating cached environment {key}")
+            builddir = Path(tempfile.mkdtemp(prefix=f"{key}.", dir=cachedir.parent))
+
+            with self.span("build cache"):
+                state = self._create(builddir, requirements, outputs, dict(env))
+            if state != RunState.SUCCESS:
+                shutil.rmtree(builddir, ignore_errors=True)
+                return state
+
+            self._relocate(builddir, builddir, cachedir)
+            try:
+                builddir.rename(cachedir)
+            except OSError:  # Created concurrently by another job
+                shutil.rmtree(builddir, ignore_errors=True)
+
+        # Restore environment from cache
+        with self.span("restore cache"):
+            if workdir.exists():
+                shutil.rmtree(workdir)
+            shutil.copytree(
+                cachedir, workdir, symlinks=True, copy_function=_link_or_copy
+            )
+            self._relocate(workdir, cachedir, workdir)
+
+        context = venv.EnvBuilder().ensure_directories(workdir)
+        env["PYTHON_EXE"] = context.env_exe
+
+        return RunState.SUCCESS
+
+    def _create(self, workdir, requirements, outputs, env):
         # Create environment
         builder = venv.EnvBuilder(clear=True, with_pip=True)
         context = builder.ensure_directories(workdir)
-        builder.create(workdir)
+        with self.span("venv"):
+            builder.create(workdir)
 
         env["PYTHON_EXE"] = context.env_exe
 
         # Update pip and setuptools
-        return _run_python_command(
-            ["-m", "pip", "install", "--upgrade", "pip", "setuptools", "wheel"],
-            workdir,
-            outputs,
-            env,
-        )
+        with self.span("pip upgrade"):
+            state = _run_python_command(
+                ["-m", "pip", "install", "--upgrade"] + list(self.PACKAGES),
+                workdir,
+                outputs,
+                env,
+            )
+        if state != RunState.SUCCESS:
+            return state
+
+        # Install requirements
+        for filepath in requirements:
+            with self.span(f"pip install {filepath.name}"):
+                state = _run_python_command(
+                    ["-m", "pip", "install", "-r", str(filepath)], workdir, outputs, env
+                )
+            if state != RunState.SUCCESS:
+                return state
+
+        return state
+
+    def _cache_key(self, requirements):
+        hasher = hashlib.sha256()
+        hasher.update(sys.executable.encode("utf8"))
+        hasher.update(sys.version.encode("utf8"))
+        hasher.update(" ".join(self.PACKAGES).encode("utf8"))
+
+        for filepath in requirements:
+            hasher.update(filepath.name.encode("utf8"))
+            _hash_file(hasher, filepath)
+
+        return hasher.hexdigest()
+
+    def _relocate(self, workdir, olddir, newdir):
+        # Scripts and configuration contain the absolute path of the environment
+        old = str(olddir).encode("utf8")
+        new = str(newdir).encode("utf8")
+
+        context = venv.EnvBuilder().ensure_directories(workdir)
+        filepaths = [workdir.joinpath("pyvenv.cfg")]
+        filepaths += Path(context.bin_path).iterdir()
+
+        for filepath in filepaths:
+            if filepath.is_symlink() or not filepath.is_file():
+                continue
+
+            content = filepath.read_bytes()
+            if b"\0" in content or old not in content:
+                continue
+
+            # Replace file to break hard link with cache
+            mode = filepath.stat().st_mode
+            filepath.unlink()
+            filepath.write_bytes(content.replace(old, new))
+            filepath.chmod(mode)
 
 
 class PythonAction(Action):
@@ -186,45 +898,247 @@ class PythonAction(Action):
         return _run_python_command(self.args, workdir, outputs, env)
 
 
+def _nodeid_to_testname(nodeid):
+    path, *names = nodeid.split("::")
+    if path.endswith(".py"):
+        path = path[:-3]
+    return ".".join([path.replace("/", ".")] + names)
+
+
+def _balance_shards(nodeids, durations, nshards):
+    default_duration = statistics.median(durations.values()) if durations else 1.0
+
+    weighted_nodeids = sorted(
+        (
+            (durations.get(_nodeid_to_testname(nodeid), default_duration), nodeid)
+            for nodeid in nodeids
+        ),
+        reverse=True,
+    )
+
+    # Assign the longest tests first to the shard with the lowest total duration
+    shards = [[] for _ in range(nshards)]
+    totals = [(0.0, i) for i in range(nshards)]
+    for duration, nodeid in weighted_nodeids:
+        total, i = heapq.heappop(totals)
+        shards[i].append(nodeid)
+        heapq.heappush(totals, (total + duration, i))
+
+    return [shard for shard in shards if shard]
+
+
 class PythonPytestAction(Action):
-    def __init__(self, name, args="", relpath=""):
+    def __init__(self, name, args="", relpath="", shards=None):
         super().__init__(name, relpath)
         self.args = shlex.split(args)
+        self.shards = shards
 
     def _run(self, workdir, outputs, env):
-        state = _run_python_command(
-            ["-m", "pip", "install", "-U", "pytest"], workdir, outputs, env
-        )
+        with self.span("pip install"):
+            state = _run_python_command(
+                ["-m", "pip", "install", "-U", "pytest"], workdir, outputs, env
+            )
         if state != RunState.SUCCESS:
             return state
 
+        if self.shards == "auto":
+            nshards = os.cpu_count() or 1
+        else:
+            nshards = int(self.shards or 1)
+
+        if nshards > 1:
+            return self._run_shards(workdir, outputs, env, nshards)
+
         with tempfile.NamedTemporaryFile(suffix=".xml", delete=True) as tmpfp:
             args = ["-m", "pytest", f"--junitxml={tmpfp.name}"] + self.args
-            state = _run_python_command(args, workdir, outputs, env)
-            self._parse_junitxml(tmpfp.name)
+            with self.span("pytest"):
+                state = _run_python_command(args, workdir, outputs, env)
+            with self.span("parse results"):
+                self._parse_junitxml(tmpfp.name)
 
         return state
 
+    def _load_durations(self, jobname):
+        actionrun_id = (
+            TestResult.objects.filter(
+                actionrun__jobrun__name=jobname, actionrun__name=self.name
+            )
+            .order_by("-actionrun__started_on")
+            .values_list("actionrun", flat=True)
+            .first()
+        )
+        if actionrun_id is None:
+            return {}
+
+        return dict(
+            (name, duration.total_seconds())
+            for name, duration in TestResult.objects.filter(
+                actionrun=actionrun_id
+            ).values_list("name", "duration")
+        )
+
+    def _run_shards(self, workdir, outputs, env, nshards):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+
+            # Make plugin importable by pytest
+            shutil.copy(
+                Path(__file__).with_name("_pytest_plugin.py"),
+                tmpdir.joinpath("djangocd_pytest_plugin.py"),
+            )
+            pythonpath = [str(tmpdir)]
+            if os.environ.get("PYTHONPATH"):
+                pythonpath.append(os.environ["PYTHONPATH"])
+            environ = dict(os.environ, PYTHONPATH=os.pathsep.join(pythonpath))
+            plugin_args = ["-m", "pytest", "-p", "djangocd_pytest_plugin"]
+
+            # Collect tests
+            collect_filepath = tmpdir.joinpath("collect.txt")
+            with self.span("collect"):
+                state = _run_python_command(
+                    plugin_args + ["--collect-only", "-qq"] + self.args,
+                    workdir,
+                    outputs,
+                    env,
+                    environ=dict(environ, **{COLLECT_ENVVAR: str(collect_filepath)}),
+                )
+            if state != RunState.SUCCESS:
+                return state
+
+            with open(collect_filepath, "r", encoding="utf8") as fp:
+                nodeids = fp.read().splitlines()
+
+            # Balance tests between shards
+            durations = self._load_durations(env["jobname"])
+            shards = _balance_shards(nodeids, durations, min(nshards, len(nodeids)))
+            outputs.append(f"Running {len(nodeids)} tests in {len(shards)} shards")
+
+            # Run shards, output is forwarded as it arrives
+            lock = threading.Lock()
+
+            def run_shard(i, nodeids):
+                select_filepath = tmpdir.joinpath(f"shard{i}.txt")
+                with open(select_filepath, "w", encoding="utf8") as fp:
+                    fp.write("\n".join(nodeids))
+
+                args = plugin_args + [f"--junitxml={tmpdir}/shard{i}.xml"] + self.args
+                environ_shard = dict(environ, **{SELECT_ENVVAR: str(select_filepath)})
+                shard_outputs = ShardOutput(outputs, f"shard {i + 1}", lock)
+                try:
+                    with self.span(f"shard {i + 1}/{len(shards)}"):
+                        return _run_python_command(
+                            args, workdir, shard_outputs, env, environ=environ_shard
+                        )
+                finally:
+                    shard_outputs.flush()
+                    connection.close()
+
+            context = contextvars.copy_context()
+            with concurrent.futures.ThreadPoolExecutor(len(shards)) as executor:
+                futures = [
+                    executor.submit(context.copy().run, run_shard, i, nodeids)
+                    for i, nodeids in enumerate(shards)
+                ]
+                states = [future.result() for future in futures]
+
+            # Merge outputs and test results
+            with self.span("parse results"):
+                for i, state in enumerate(states):
+                    outputs.append(f"[shard {i + 1}/{len(shards)}] ({state})")
+
+                    xml_filepath = tmpdir.joinpath(f"shard{i}.xml")
+                    if xml_filepath.exists():
+                        self._parse_junitxml(xml_filepath)
+
+        if RunState.ERROR in states:
+            return RunState.ERROR
+        if RunState.FAILED in states:
+            return RunState.FAILED
+        return RunState.SUCCESS
+
     def _parse_junitxml(self, filepath):
-        root = ElementTree.parse(filepath).getroot()
-
-        for element in root.iterfind(".//testcase"):
-            name = f"{element.get('classname', '')}.{element.get('name', '')}"
-            duration = datetime.timedelta(seconds=float(element.get("time", 0.0)))
-
-            state = RunState.SUCCESS
-            output = ""
-            if element.find("error") is not None:
-                state = RunState.ERROR
-                output = element.findtext("error", "")
-            elif element.find("failure") is not None:
-                state = RunState.FAILED
-                output = element.findtext("failure", "")
-            elif element.find("skipped") is not None:
-                state = RunState.SKIPPED
-                output = element.findtext("skipped", "")
-
-            self.add_testresult(name, state, duration, output)
+        testresults = []
+        parents = []
+
+        with transaction.atomic():
+            for event, element in ElementTree.iterparse(
+                filepath, events=("start", "end")
+            ):
+                if event == "start":
+                    parents.append(element)
+                    continue
+
+                parents.pop()
+                if element.tag != "testcase":
+                    continue
+
+                testresults.append(self._parse_testcase(element))
+                if len(testresults) >= BULK_SIZE:
+                    self.add_testresults(testresults)
+                    testresults.clear()
+
+                # Release parsed testcase
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+
+            self.add_testresults(testresults)
+
+    def _parse_testcase(self, element):
+        name = f"{element.get('classname', '')}.{element.get('name', '')}"
+        duration = datetime.timedelta(seconds=float(element.get("time", 0.0)))
+
+        state = RunState.SUCCESS
+        output = ""
+        if element.find("error") is not None:
+            state = RunState.ERROR
+            output = element.findtext("error", "")
+        elif element.find("failure") is not None:
+            state = RunState.FAILED
+            output = element.findtext("failure", "")
+        elif element.find("skipped") is not None:
+            state = RunState.SKIPPED
+            output = element.findtext("skipped", "")
+
+        return name, state, duration, output
+
+
+class ArtifactFetchAction(Action):
+    def __init__(self, name, action, job=None, relpath=""):
+        super().__init__(name, relpath)
+        self.action = action
+        self.job = job
+
+    def _run(self, workdir, outputs, env):
+        if self.job is None:
+            queryset = ActionRun.objects.filter(
+                jobrun=self._actionrun.jobrun_id,
+                name=self.action,
+                state=RunState.SUCCESS,
+            )
+        else:
+            queryset = ActionRun.objects.filter(
+                jobrun__name=self.job, name=self.action, state=RunState.SUCCESS
+            )
+
+        actionrun = queryset.order_by("-started_on").first()
+        if actionrun is None:
+            outputs.append(f"No run found for action {self.action}")
+            return RunState.FAILED
+
+        if actionrun.cached_from_id is not None:
+            actionrun = actionrun.cached_from
+
+        workdir.mkdir(parents=True, exist_ok=True)
+        artifacts = link_artifacts(actionrun, workdir)
+        if not artifacts:
+            outputs.append(f"No artifact stored by action run #{actionrun.id}")
+            return RunState.FAILED
+
+        for artifact in artifacts:
+            outputs.append(f"{artifact.path} ({artifact.digest[:12]})")
+
+        return RunState.SUCCESS
 
 
 class MsbuildAction(Action):
@@ -1,11 +1,11 @@
 """"""
 
 # Standard library modules.
-import sys
 
 # Third party modules.
 from django.apps import AppConfig
 from django.conf import settings
+from django.utils import timezone
 
 # Local modules.
 from loguru import logger
@@ -18,17 +18,49 @@ class DjangoCdConfig(AppConfig):
     name = "django_cd"
 
     def ready(self):
-        if any("manage.py" in arg for arg in sys.argv) and "runserver" not in sys.argv:
-            return
+        from . import signals  # noqa: F401
 
+        self._jobs = None
+        self._nextruns = None
+
+    @property
+    def jobs(self):
+        # Loaded on first use, as workers started by manage.py need them too
+        if self._jobs is None:
+            self._jobs = self._load_jobs()
+        return self._jobs
+
+    def reload_jobs(self):
+        self._jobs = self._load_jobs()
+        self._nextruns = None
+        return self._jobs
+
+    @property
+    def nextruns(self):
+        # Index of next runs, recomputed once the earliest one has passed
+        if self._nextruns is not None:
+            expires, nextruns = self._nextruns
+            if expires is None or expires > timezone.now():
+                return nextruns
+
+        nextruns = dict((name, job.nextrun) for name, job in self.jobs.items())
+        expires = min(
+            (nextrun for nextrun in nextruns.values() if nextrun is not None),
+            default=None,
+        )
+        self._nextruns = (expires, nextruns)
+        return nextruns
+
+    def _load_jobs(self):
         from .jobs import Job
 
-        self.jobs = {}
+        jobs = {}
         for filepath in getattr(settings, "JOBFILES", []):
             job = Job.from_yaml(filepath)
-            if job.name in self.jobs:
+            if job.name in jobs:
                 logger.error(f"Job {job.name} already added")
                 continue
 
-            job.register()
-            self.jobs[job.name] = job
+            jobs[job.name] = job
+
+        return jobs
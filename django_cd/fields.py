@@ -0,0 +1,71 @@
+""""""
+
+# Standard library modules.
+import zlib
+
+# Third party modules.
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# Local modules.
+
+# Globals and constants variables.
+HEADER_RAW = b"\x00"
+HEADER_ZLIB = b"\x01"
+MIN_COMPRESS_SIZE = 128
+COMPRESS_LEVEL = 6
+
+
+def compress(text):
+    data = text.encode("utf8")
+    if len(data) >= MIN_COMPRESS_SIZE:
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        if len(compressed) < len(data):
+            return HEADER_ZLIB + compressed
+    return HEADER_RAW + data
+
+
+def decompress(value):
+    value = bytes(value)
+    header, data = value[:1], value[1:]
+
+    if header == HEADER_ZLIB:
+        data = zlib.decompress(data)
+    elif header != HEADER_RAW:
+        raise ValueError(f"Unknown compression header: {header!r}")
+
+    return data.decode("utf8")
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        # Decompress on first access only
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = decompress(value)
+            instance.__dict__[self.field.attname] = value
+
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    descriptor_class = CompressedTextDescriptor
+
+    def get_prep_value(self, value):
+        if isinstance(value, str):
+            value = compress(value)
+        return super().get_prep_value(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress(value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
@@ -4,40 +4,166 @@
 from pathlib import Path
 import time
 import datetime
+import concurrent.futures
+import hashlib
+import itertools
+import re
+import string
 
 # Third party modules.
 import yaml
 from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Sum
+from django.utils import timezone
 from django.utils.module_loading import import_string
 from loguru import logger
 
 # Local modules.
-from .models import JobRun, RunState
+from .models import TEST_COUNTER_FIELDS, JobRun, RunState
+from . import metrics
+from .retention import RetentionPolicy, delete_jobruns
+from .signals import invalidate_jobruns
+from .tasks import run_job
 
 # Globals and constants variables.
+QUEUE_ONE = "queue-one"
+SKIP_IF_RUNNING = "skip-if-running"
+CANCEL_PREVIOUS = "cancel-previous"
+CONCURRENCY_POLICIES = (QUEUE_ONE, SKIP_IF_RUNNING, CANCEL_PREVIOUS)
+
+
+def _substitute(value, variables):
+    if isinstance(value, str):
+        return string.Template(value).safe_substitute(variables)
+    if isinstance(value, list):
+        return [_substitute(item, variables) for item in value]
+    if isinstance(value, dict):
+        return dict((key, _substitute(item, variables)) for key, item in value.items())
+    return value
+
+
+def _create_actions(actions_kwargs):
+    actions = []
+    for action_kwargs in actions_kwargs:
+        action_kwargs = dict(action_kwargs)
+        name = action_kwargs.pop("name")
+        uses = action_kwargs.pop("uses")
+        needs = action_kwargs.pop("needs", None)
+        inputs = action_kwargs.pop("inputs", None)
+        artifacts = action_kwargs.pop("artifacts", None)
+
+        import_name = settings.ACTIONS[uses]
+        action_class = import_string(import_name)
+        action = action_class(name=name, **action_kwargs)
+
+        if needs is not None:
+            action.needs = (needs,) if isinstance(needs, str) else tuple(needs)
+        if inputs is not None:
+            action.inputs = inputs
+        if artifacts is not None:
+            action.artifacts = tuple(artifacts)
+
+        actions.append(action)
+
+    return actions
 
 
 class Job:
-    def __init__(self, name, workdir, triggers=None, actions=None, notifications=None):
+    def __init__(
+        self,
+        name,
+        workdir,
+        triggers=None,
+        actions=None,
+        notifications=None,
+        max_workers=None,
+        variants=None,
+        retention=None,
+        digest=None,
+        concurrency=None,
+    ):
         self.name = name
         self.workdir = workdir
 
         if triggers is None:
             triggers = []
         self.triggers = tuple(triggers)
+        for trigger in self.triggers:
+            trigger.bind(self)
 
         if actions is None:
-            triggers = []
+            actions = []
         self.actions = tuple(actions)
 
         if notifications is None:
             notifications = []
         self.notifications = tuple(notifications)
 
+        self.max_workers = max_workers
+
+        if variants is None:
+            variants = []
+        self.variants = tuple(variants)
+
+        self.retention = retention
+        self.digest = digest
+
+        if concurrency is not None and concurrency not in CONCURRENCY_POLICIES:
+            raise ValueError(f"Unknown concurrency policy: {concurrency}")
+        self.concurrency = concurrency
+
+        self.dependencies = self._resolve_dependencies()
+
+    def _resolve_dependencies(self):
+        actions_by_name = {}
+        for action in self.actions:
+            actions_by_name.setdefault(action.name, []).append(action)
+
+        # Actions without "needs" depend on the previous action
+        dependencies = {}
+        previous_action = None
+        for action in self.actions:
+            if action.needs is None:
+                needs = [] if previous_action is None else [previous_action]
+            else:
+                needs = []
+                for name in action.needs:
+                    if name not in actions_by_name:
+                        raise ValueError(
+                            f"Action {action.name} needs unknown action {name}"
+                        )
+                    if len(actions_by_name[name]) > 1:
+                        raise ValueError(
+                            f"Action {action.name} needs ambiguous action {name}"
+                        )
+                    needs.append(actions_by_name[name][0])
+
+            dependencies[action] = tuple(needs)
+            previous_action = action
+
+        # Check for cycles
+        remaining = dict(dependencies)
+        while remaining:
+            ready = [
+                action
+                for action, needs in remaining.items()
+                if not any(other in remaining for other in needs)
+            ]
+            if not ready:
+                names = ", ".join(action.name for action in remaining)
+                raise ValueError(f"Cyclic dependencies between actions: {names}")
+
+            for action in ready:
+                del remaining[action]
+
+        return dependencies
+
     @classmethod
     def from_yaml(cls, filepath):
         with open(filepath, "r") as fp:
-            d = yaml.load(fp.read(), Loader=yaml.Loader)
+            content = fp.read()
+        d = yaml.load(content, Loader=yaml.Loader)
 
         jobname = d["name"]
         workdir = Path(d.get("workdir", settings.WORKDIR))
@@ -51,15 +177,29 @@ class Job:
             trigger = trigger_class(**trigger_kwargs)
             triggers.append(trigger)
 
-        actions = []
-        for action_kwargs in d.get("actions", []):
-            name = action_kwargs.pop("name")
-            uses = action_kwargs.pop("uses")
+        max_workers = d.get("max_workers")
 
-            import_name = settings.ACTIONS[uses]
-            action_class = import_string(import_name)
-            action = action_class(name=name, **action_kwargs)
-            actions.append(action)
+        actions = []
+        variants = []
+        matrix = d.get("matrix")
+        if matrix:
+            keys = list(matrix.keys())
+            for values in itertools.product(*(matrix[key] for key in keys)):
+                variables = dict(zip(keys, map(str, values)))
+                label = ", ".join(f"{key}={value}" for key, value in variables.items())
+                dirname = re.sub(r"[^\w.-]+", "_", "-".join(variables.values()))
+
+                variant = cls(
+                    f"{jobname} ({label})",
+                    workdir.joinpath(dirname),
+                    actions=_create_actions(
+                        _substitute(d.get("actions", []), variables)
+                    ),
+                    max_workers=max_workers,
+                )
+                variants.append(variant)
+        else:
+            actions = _create_actions(d.get("actions", []))
 
         notifications = []
         for notification_kwargs in d.get("notifications", []):
@@ -70,38 +210,175 @@ class Job:
             notification = notification_class(**notification_kwargs)
             notifications.append(notification)
 
-        return cls(jobname, workdir, triggers, actions, notifications)
+        retention = None
+        if "retention" in d:
+            retention = RetentionPolicy(**d["retention"])
+
+        return cls(
+            jobname,
+            workdir,
+            triggers,
+            actions,
+            notifications,
+            max_workers,
+            variants,
+            retention,
+            hashlib.sha256(content.encode("utf8")).hexdigest(),
+            d.get("concurrency"),
+        )
+
+    def prune(self):
+        if self.retention is None:
+            return 0
+
+        jobrun_ids = self.retention.find_expired(self.name)
+        return delete_jobruns(jobrun_ids)
+
+    def has_changes(self):
+        if self.variants:
+            return any(variant.has_changes() for variant in self.variants)
+
+        revisions = {}
+        for action in self.actions:
+            revision = action.upstream_revision()
+            if revision is not None:
+                revisions[action.name] = revision
+
+        if not revisions:
+            return True
+
+        jobrun = (
+            JobRun.objects.filter(name=self.name, state=RunState.SUCCESS)
+            .order_by("-started_on")
+            .first()
+        )
+        if jobrun is None:
+            return True
+
+        previous_revisions = dict(
+            jobrun.actionruns.filter(name__in=revisions.keys()).values_list(
+                "name", "revision"
+            )
+        )
+        return previous_revisions != revisions
+
+    def _create_pending(self):
+        # Only one run per key, so the policy holds across processes
+        key = self.name if self.concurrency is not None else None
+
+        try:
+            with transaction.atomic():
+                if self.concurrency == CANCEL_PREVIOUS:
+                    count = JobRun.objects.filter(
+                        concurrency_key=key, state=RunState.PENDING
+                    ).update(state=RunState.SKIPPED, concurrency_key=None)
+                    if count:
+                        transaction.on_commit(invalidate_jobruns)
+
+                return JobRun.objects.create(
+                    name=self.name, state=RunState.PENDING, concurrency_key=key
+                )
+        except IntegrityError:
+            return None
 
-    def register(self):
-        for trigger in self.triggers:
-            trigger.register(self)
-            logger.info(f"Registered trigger: {trigger}")
+    def enqueue(self, scheduled_on=None, skip_unchanged=False):
+        jobrun = self._create_pending()
+        if jobrun is None:
+            logger.info(f"Job: {self.name} (coalesced, {self.concurrency})")
+            return None
 
-    def run(self, notify=True):
-        logger.info(f"Job: {self.name} ({self.workdir})")
+        try:
+            run_job(self.name, self.digest, scheduled_on, skip_unchanged, jobrun.id)
+        except Exception:
+            # Pending run would otherwise block the job
+            JobRun.objects.filter(pk=jobrun.pk, state=RunState.PENDING).delete()
+            raise
+
+        return jobrun
+
+    def _start_pending(self, jobrun):
+        # Runs share the workdir, the key is held while running
+        key = None
+        if self.concurrency == SKIP_IF_RUNNING:
+            key = self.name
+        elif self.concurrency is not None:
+            key = f"{self.name}:running"
+
+        # Runs cancelled while pending are not started
+        started_on = timezone.now()
+        try:
+            with transaction.atomic():
+                count = JobRun.objects.filter(
+                    pk=jobrun.pk, state=RunState.PENDING
+                ).update(
+                    state=RunState.RUNNING, started_on=started_on, concurrency_key=key
+                )
+        except IntegrityError:
+            # Another run of the job is running, the run stays pending
+            return None
 
-        # Create JobRun
-        jobrun = JobRun.objects.create(name=self.name, state=RunState.RUNNING)
+        invalidate_jobruns()
+        if not count:
+            return False
 
-        # Run actions
-        start_time = time.time()
-        nactions = len(self.actions)
-        states = set()
-        env = {}
+        jobrun.state = RunState.RUNNING
+        jobrun.started_on = started_on
+        jobrun.concurrency_key = key
+        return True
 
-        for i, action in enumerate(self.actions):
-            logger.info(f"Action ({i+1}/{nactions}): {action}")
+    def run(self, notify=True, parent=None, skip_unchanged=False, jobrun=None):
+        if skip_unchanged and not self.has_changes():
+            logger.info(f"Job: {self.name} (skipped, no upstream changes)")
+            if jobrun is not None:
+                JobRun.objects.filter(pk=jobrun.pk, state=RunState.PENDING).delete()
+            return None
 
-            state = action.run(jobrun, self.workdir, env)
-            states.add(state)
+        logger.info(f"Job: {self.name} ({self.workdir})")
 
-            logger.info(f"Action ({i+1}/{nactions}): {action} ({state})")
+        # Create JobRun, or start the pending one
+        if jobrun is None:
+            jobrun = JobRun.objects.create(
+                name=self.name, state=RunState.RUNNING, parent=parent
+            )
+        else:
+            started = self._start_pending(jobrun)
+            if started is None:
+                logger.info(f"Job: {self.name} (waiting, {self.concurrency})")
+                return None
+            if not started:
+                logger.info(f"Job: {self.name} (cancelled)")
+                return None
 
-            if state != RunState.SUCCESS:
-                break
+        # Run actions
+        start_time = time.time()
+        states = {RunState.ERROR}
+
+        try:
+            if self.variants:
+                states = self._run_variants(jobrun)
+            elif any(action.needs is not None for action in self.actions):
+                states = self._run_actions_concurrently(jobrun)
+            else:
+                states = self._run_actions_sequentially(jobrun)
+        finally:
+            # Always saved, so the run does not stay running
+            self._finish(jobrun, states, time.time() - start_time)
+
+        # Update metrics
+        metrics.inc(metrics.JOB_RUNS, {"job": self.name, "state": jobrun.state})
+        metrics.observe(
+            metrics.JOB_DURATION, jobrun.duration.total_seconds(), {"job": self.name}
+        )
+
+        # Notifications
+        if notify:
+            for notification in self.notifications:
+                notification.notify(jobrun)
+                logger.info(f"  Notification: {notification}")
 
-        end_time = time.time()
+        return jobrun
 
+    def _finish(self, jobrun, states, duration):
         # Determine job state
         if not states:
             jobrun.state = RunState.NOT_STARTED
@@ -114,15 +391,108 @@ class Job:
         else:
             jobrun.state = RunState.SUCCESS
 
+        # Roll up test counters of actions or variants
+        fields = list(TEST_COUNTER_FIELDS.values()) + ["tests_duration"]
+        source = jobrun.children if self.variants else jobrun.actionruns
+        totals = source.aggregate(**dict((field, Sum(field)) for field in fields))
+        for field in fields:
+            if totals[field] is not None:
+                setattr(jobrun, field, totals[field])
+
         # Save JobRun
-        jobrun.duration = datetime.timedelta(seconds=end_time - start_time)
-        jobrun.save(update_fields=["duration", "state"])
+        jobrun.duration = datetime.timedelta(seconds=duration)
+        jobrun.concurrency_key = None
+        jobrun.save(update_fields=["duration", "state", "concurrency_key"] + fields)
 
-        # Notifications
-        if notify:
-            for notification in self.notifications:
-                notification.notify(jobrun)
-                logger.info(f"  Notification: {notification}")
+    def _run_action(self, action, jobrun, env):
+        i = self.actions.index(action)
+        nactions = len(self.actions)
+        logger.info(f"Action ({i+1}/{nactions}): {action}")
+
+        state = action.run(jobrun, self.workdir, env)
+
+        logger.info(f"Action ({i+1}/{nactions}): {action} ({state})")
+        return state
+
+    def _run_action_in_thread(self, action, jobrun, env):
+        try:
+            return self._run_action(action, jobrun, env)
+        finally:
+            connection.close()
+
+    def _run_actions_sequentially(self, jobrun):
+        states = set()
+        env = {}
+
+        for action in self.actions:
+            state = self._run_action(action, jobrun, env)
+            states.add(state)
+
+            if state != RunState.SUCCESS:
+                break
+
+        return states
+
+    def _run_actions_concurrently(self, jobrun):
+        states = {}
+        envs = {}
+        pending = list(self.actions)
+        running = {}
+        failed = False
+
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            while pending or running:
+                # Submit actions for which all needed actions succeeded
+                for action in list(pending):
+                    if failed:
+                        break
+
+                    needs = self.dependencies[action]
+                    if any(states.get(other) != RunState.SUCCESS for other in needs):
+                        continue
+
+                    env = {}
+                    for other in needs:
+                        env.update(envs[other])
+
+                    future = executor.submit(
+                        self._run_action_in_thread, action, jobrun, env
+                    )
+                    running[future] = (action, env)
+                    pending.remove(action)
+
+                if not running:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    action, env = running.pop(future)
+                    states[action] = future.result()
+                    envs[action] = env
+
+                    if states[action] != RunState.SUCCESS:
+                        failed = True
+
+        return set(states.values())
+
+    def _run_variant_in_thread(self, variant, jobrun):
+        try:
+            return variant.run(notify=False, parent=jobrun).state
+        finally:
+            connection.close()
+
+    def _run_variants(self, jobrun):
+        for variant in self.variants:
+            Path(variant.workdir).mkdir(parents=True, exist_ok=True)
+
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            futures = [
+                executor.submit(self._run_variant_in_thread, variant, jobrun)
+                for variant in self.variants
+            ]
+            return set(future.result() for future in futures)
 
     @property
     def nextrun(self):
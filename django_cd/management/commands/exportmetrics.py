@@ -0,0 +1,33 @@
+""""""
+
+# Standard library modules.
+from pathlib import Path
+
+# Third party modules.
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+# Local modules.
+from django_cd.metrics import render, write_textfile
+
+# Globals and constants variables.
+
+
+class Command(BaseCommand):
+    help = "Export metrics in the Prometheus text format"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "filepath",
+            type=Path,
+            nargs="?",
+            help="Path of textfile for node-exporter (default: METRICS_TEXTFILE setting, or stdout)",
+        )
+
+    def handle(self, *args, **options):
+        filepath = options["filepath"] or getattr(settings, "METRICS_TEXTFILE", None)
+
+        if filepath:
+            write_textfile(filepath)
+        else:
+            self.stdout.write(render(), ending="")
@@ -0,0 +1,50 @@
+""""""
+
+# Standard library modules.
+from pathlib import Path
+
+# Third party modules.
+from django.core.management.base import BaseCommand
+
+# Local modules.
+from django_cd.jobs import Job
+from django_cd.retention import RetentionPolicy, delete_jobruns, BATCH_SIZE
+
+# Globals and constants variables.
+
+
+class Command(BaseCommand):
+    help = "Delete job runs outside the retention policy of job(s)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("filepath", type=Path, nargs="+", help="Path job file")
+        parser.add_argument("--runs", type=int, help="Override number of runs to keep")
+        parser.add_argument("--days", type=int, help="Override number of days to keep")
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE, help="Rows per statement"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report expired runs"
+        )
+
+    def handle(self, *args, **options):
+        filepaths = options["filepath"]
+
+        for filepath in filepaths:
+            job = Job.from_yaml(filepath)
+
+            retention = job.retention
+            if options["runs"] is not None or options["days"] is not None:
+                retention = RetentionPolicy(options["runs"], options["days"])
+
+            if retention is None:
+                self.stdout.write(f"{job.name}: no retention policy")
+                continue
+
+            jobrun_ids = retention.find_expired(job.name)
+            if options["dry_run"]:
+                self.stdout.write(f"{job.name}: {len(jobrun_ids)} expired run(s)")
+                continue
+
+            count = delete_jobruns(jobrun_ids, options["batch_size"])
+            self.stdout.write(f"{job.name}: deleted {count} run(s)")
@@ -0,0 +1,31 @@
+""""""
+
+# Standard library modules.
+import signal
+import threading
+
+# Third party modules.
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+# Local modules.
+from django_cd.scheduler import Scheduler
+
+# Globals and constants variables.
+
+
+class Command(BaseCommand):
+    help = "Enqueue runs of jobs when their triggers fire"
+
+    def handle(self, *args, **options):
+        app = apps.get_app_config("django_cd")
+
+        scheduler = Scheduler()
+        scheduler.load(app.jobs.values())
+        self.stdout.write(f"Scheduled {len(scheduler)} trigger(s)")
+
+        stop = threading.Event()
+        for signum in [signal.SIGINT, signal.SIGTERM]:
+            signal.signal(signum, lambda *args: stop.set())
+
+        scheduler.run(stop)
@@ -0,0 +1,190 @@
+""""""
+
+# Standard library modules.
+import contextlib
+import math
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+# Third party modules.
+from django.db import DatabaseError
+from django.db.models import F
+from huey.contrib import djhuey
+from loguru import logger
+
+# Local modules.
+from .models import JobRun, Metric, RunState
+
+# Globals and constants variables.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600)
+
+JOB_RUNS = "djangocd_job_runs_total"
+JOB_DURATION = "djangocd_job_duration_seconds"
+JOBS_RUNNING = "djangocd_jobs_running"
+ACTION_RUNS = "djangocd_action_runs_total"
+ACTION_DURATION = "djangocd_action_duration_seconds"
+SCHEDULE_LATENCY = "djangocd_schedule_latency_seconds"
+QUEUE_PENDING = "djangocd_queue_pending"
+
+FAMILIES = {
+    JOB_RUNS: ("counter", "Number of finished job runs"),
+    JOB_DURATION: ("histogram", "Duration of job runs"),
+    JOBS_RUNNING: ("gauge", "Number of job runs in progress"),
+    ACTION_RUNS: ("counter", "Number of finished action runs"),
+    ACTION_DURATION: ("histogram", "Duration of action runs"),
+    SCHEDULE_LATENCY: ("histogram", "Delay between scheduling and start of jobs"),
+    QUEUE_PENDING: ("gauge", "Number of tasks waiting in the huey queue"),
+}
+
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _create(name, labels_list):
+    Metric.objects.bulk_create(
+        [Metric(name=name, labels=labels) for labels in labels_list],
+        ignore_conflicts=True,
+    )
+
+
+def _add(name, labels_list, amount):
+    Metric.objects.filter(name=name, labels__in=labels_list).update(
+        value=F("value") + amount
+    )
+
+
+@contextlib.contextmanager
+def _updating():
+    # Metrics are best effort and must never fail a run
+    try:
+        with _lock:
+            yield
+    except DatabaseError:
+        logger.exception("While updating metrics")
+
+
+def inc(name, labels=None, amount=1):
+    labels = _format_labels(labels or {})
+    with _updating():
+        _create(name, [labels])
+        _add(name, [labels], amount)
+
+
+def dec(name, labels=None, amount=1):
+    inc(name, labels, -amount)
+
+
+def observe(name, value, labels=None, buckets=DURATION_BUCKETS):
+    labels = dict(labels or {})
+    bounds = list(buckets) + [math.inf]
+    bucket_labels = [
+        _format_labels(dict(labels, le=_format_value(le))) for le in bounds
+    ]
+    labels = _format_labels(labels)
+
+    with _updating():
+        # All buckets are created on first observation so that all are exposed
+        _create(f"{name}_bucket", bucket_labels)
+        _create(f"{name}_count", [labels])
+        _create(f"{name}_sum", [labels])
+
+        # Buckets are cumulative
+        _add(
+            f"{name}_bucket",
+            [item for le, item in zip(bounds, bucket_labels) if value <= le],
+            1,
+        )
+        _add(f"{name}_count", [labels], 1)
+        _add(f"{name}_sum", [labels], value)
+
+
+def _sort_key(metric):
+    # Buckets must be listed in increasing order of their upper bound
+    labels, _, le = metric.labels.rpartition('le="')
+    if metric.name.endswith("_bucket") and le:
+        return (metric.name, labels, float(le.rstrip('"').replace("+Inf", "inf")))
+    return (metric.name, metric.labels, 0.0)
+
+
+def _family(name):
+    for suffix in ["_bucket", "_count", "_sum"]:
+        if name.endswith(suffix) and name[: -len(suffix)] in FAMILIES:
+            return name[: -len(suffix)]
+    return name
+
+
+def _queue_pending():
+    # Instance configured by djhuey, whatever the form of the HUEY setting
+    try:
+        return djhuey.HUEY.pending_count()
+    except Exception:
+        logger.exception("While counting pending tasks")
+        return None
+
+
+def _jobs_running():
+    # Counted when scraped, so killed workers do not leave it too high
+    return JobRun.objects.filter(state=RunState.RUNNING, parent__isnull=True).count()
+
+
+def render():
+    samples = dict((name, []) for name in FAMILIES)
+    for metric in sorted(Metric.objects.all(), key=_sort_key):
+        samples.setdefault(_family(metric.name), []).append(metric)
+
+    lines = []
+    for family, metrics in samples.items():
+        if family not in FAMILIES:
+            continue
+
+        kind, description = FAMILIES[family]
+        lines.append(f"# HELP {family} {description}")
+        lines.append(f"# TYPE {family} {kind}")
+
+        if family == QUEUE_PENDING:
+            pending = _queue_pending()
+            if pending is not None:
+                lines.append(f"{family} {pending}")
+            continue
+
+        if family == JOBS_RUNNING:
+            lines.append(f"{family} {_jobs_running()}")
+            continue
+
+        for metric in metrics:
+            labels = f"{{{metric.labels}}}" if metric.labels else ""
+            lines.append(f"{metric.name}{labels} {_format_value(metric.value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(filepath):
+    filepath = Path(filepath)
+    content = render()
+
+    # Replace atomically so that node-exporter never reads a partial file
+    fd, tmpfilepath = tempfile.mkstemp(prefix=f".{filepath.name}.", dir=filepath.parent)
+    with os.fdopen(fd, "w", encoding="utf8") as fp:
+        fp.write(content)
+    os.chmod(tmpfilepath, 0o644)
+    os.replace(tmpfilepath, filepath)
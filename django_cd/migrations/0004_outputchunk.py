@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_output_to_chunks(apps, schema_editor):
+    ActionRun = apps.get_model('django_cd', 'ActionRun')
+    OutputChunk = apps.get_model('django_cd', 'OutputChunk')
+
+    chunks = []
+    queryset = ActionRun.objects.exclude(output__isnull=True).exclude(output='')
+    for id, output in queryset.values_list('id', 'output').iterator(chunk_size=500):
+        chunks.append(OutputChunk(actionrun_id=id, offset=0, text=output))
+        if len(chunks) >= 500:
+            OutputChunk.objects.bulk_create(chunks)
+            chunks.clear()
+    OutputChunk.objects.bulk_create(chunks)
+
+
+def move_chunks_to_output(apps, schema_editor):
+    ActionRun = apps.get_model('django_cd', 'ActionRun')
+    OutputChunk = apps.get_model('django_cd', 'OutputChunk')
+
+    for actionrun in ActionRun.objects.iterator(chunk_size=500):
+        texts = OutputChunk.objects.filter(actionrun=actionrun).order_by('offset').values_list('text', flat=True)
+        actionrun.output = ''.join(texts)
+        actionrun.save(update_fields=['output'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0003_testresult_output'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutputChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.PositiveBigIntegerField()),
+                ('text', models.TextField()),
+                ('actionrun', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outputchunks', to='django_cd.actionrun')),
+            ],
+            options={
+                'ordering': ['offset'],
+                'constraints': [models.UniqueConstraint(fields=('actionrun', 'offset'), name='unique_outputchunk_offset')],
+            },
+        ),
+        migrations.RunPython(move_output_to_chunks, move_chunks_to_output),
+    ]
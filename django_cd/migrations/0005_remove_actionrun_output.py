@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0004_outputchunk'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='actionrun',
+            name='output',
+        ),
+    ]
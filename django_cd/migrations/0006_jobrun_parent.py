@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0005_remove_actionrun_output'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='parent',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='django_cd.jobrun'),
+        ),
+    ]
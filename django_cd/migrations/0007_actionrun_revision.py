@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0006_jobrun_parent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionrun',
+            name='revision',
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0007_actionrun_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionrun',
+            name='cached_from',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='django_cd.actionrun'),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='inputs_hash',
+            field=models.CharField(db_index=True, max_length=64, null=True),
+        ),
+    ]
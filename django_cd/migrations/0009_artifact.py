@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0008_actionrun_cached_from_actionrun_inputs_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Artifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024)),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveBigIntegerField()),
+                ('actionrun', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artifacts', to='django_cd.actionrun')),
+            ],
+            options={
+                'ordering': ['path'],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:20
+
+from django.db import migrations, models
+import django_cd.fields
+
+BATCH_SIZE = 500
+
+
+def _copy_in_batches(Model, source, target):
+    last_pk = 0
+    while True:
+        objs = list(Model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', source)[:BATCH_SIZE])
+        if not objs:
+            break
+
+        for obj in objs:
+            setattr(obj, target, getattr(obj, source))
+        Model.objects.bulk_update(objs, [target])
+
+        last_pk = objs[-1].pk
+
+
+def compress_output(apps, schema_editor):
+    _copy_in_batches(apps.get_model('django_cd', 'OutputChunk'), 'text', 'compressed_text')
+    _copy_in_batches(apps.get_model('django_cd', 'TestResult'), 'output', 'compressed_output')
+
+
+def decompress_output(apps, schema_editor):
+    _copy_in_batches(apps.get_model('django_cd', 'OutputChunk'), 'compressed_text', 'text')
+    _copy_in_batches(apps.get_model('django_cd', 'TestResult'), 'compressed_output', 'output')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0009_artifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outputchunk',
+            name='compressed_text',
+            field=django_cd.fields.CompressedTextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='compressed_output',
+            field=django_cd.fields.CompressedTextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='outputchunk',
+            name='text',
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(compress_output, decompress_output),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:20
+
+from django.db import migrations
+import django_cd.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0010_compress_output'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='outputchunk',
+            name='text',
+        ),
+        migrations.RenameField(
+            model_name='outputchunk',
+            old_name='compressed_text',
+            new_name='text',
+        ),
+        migrations.AlterField(
+            model_name='outputchunk',
+            name='text',
+            field=django_cd.fields.CompressedTextField(),
+        ),
+        migrations.RemoveField(
+            model_name='testresult',
+            name='output',
+        ),
+        migrations.RenameField(
+            model_name='testresult',
+            old_name='compressed_output',
+            new_name='output',
+        ),
+    ]
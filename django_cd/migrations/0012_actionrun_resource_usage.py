@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0011_replace_output_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionrun',
+            name='cpu_system_time',
+            field=models.DurationField(null=True),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='cpu_user_time',
+            field=models.DurationField(null=True),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='involuntary_context_switches',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='io_read_blocks',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='io_write_blocks',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='max_rss',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='voluntary_context_switches',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0012_actionrun_resource_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('started_on', models.DateTimeField()),
+                ('duration', models.DurationField()),
+                ('actionrun', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spans', to='django_cd.actionrun')),
+            ],
+            options={
+                'ordering': ['started_on', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0014_metric'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actionrun',
+            index=models.Index(fields=['name', '-started_on'], name='djangocd_action_name_started'),
+        ),
+        migrations.AddIndex(
+            model_name='jobrun',
+            index=models.Index(fields=['name', '-started_on'], name='djangocd_job_name_started'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:10
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0015_name_started_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionrun',
+            name='tests_duration',
+            field=models.DurationField(default=datetime.timedelta),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='tests_error',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='tests_failed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='tests_passed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='actionrun',
+            name='tests_skipped',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='tests_duration',
+            field=models.DurationField(default=datetime.timedelta),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='tests_error',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='tests_failed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='tests_passed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='tests_skipped',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import datetime
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+BATCH_SIZE = 500
+
+COUNTER_FIELDS = {
+    'success': 'tests_passed',
+    'failed': 'tests_failed',
+    'error': 'tests_error',
+    'skipped': 'tests_skipped',
+}
+FIELDS = list(COUNTER_FIELDS.values()) + ['tests_duration']
+
+
+def _batches(Model, queryset):
+    last_pk = 0
+    while True:
+        objs = list(queryset.filter(pk__gt=last_pk).order_by('pk').only('pk')[:BATCH_SIZE])
+        if not objs:
+            break
+
+        yield objs
+
+        last_pk = objs[-1].pk
+
+
+def backfill_actionruns(apps, schema_editor):
+    ActionRun = apps.get_model('django_cd', 'ActionRun')
+    TestResult = apps.get_model('django_cd', 'TestResult')
+
+    for actionruns in _batches(ActionRun, ActionRun.objects.filter(testresults__isnull=False).distinct()):
+        actionruns = dict((actionrun.pk, actionrun) for actionrun in actionruns)
+        for actionrun in actionruns.values():
+            actionrun.tests_duration = datetime.timedelta(0)
+
+        items = (
+            TestResult.objects.filter(actionrun__in=actionruns.keys())
+            .values('actionrun', 'state')
+            .annotate(count=Count('id'), duration=Sum('duration'))
+            .order_by()
+        )
+        for item in items:
+            actionrun = actionruns[item['actionrun']]
+            if item['state'] in COUNTER_FIELDS:
+                setattr(actionrun, COUNTER_FIELDS[item['state']], item['count'])
+            actionrun.tests_duration += item['duration'] or datetime.timedelta(0)
+
+        ActionRun.objects.bulk_update(actionruns.values(), FIELDS)
+
+
+def _rollup(JobRun, queryset, relation):
+    for jobruns in _batches(JobRun, queryset):
+        jobruns = dict((jobrun.pk, jobrun) for jobrun in jobruns)
+
+        items = (
+            JobRun.objects.filter(pk__in=jobruns.keys())
+            .values('pk')
+            .annotate(**dict((field, Sum(f'{relation}__{field}')) for field in FIELDS))
+            .order_by()
+        )
+        for item in items:
+            jobrun = jobruns[item['pk']]
+            for field in FIELDS:
+                if item[field] is not None:
+                    setattr(jobrun, field, item[field])
+
+        JobRun.objects.bulk_update(jobruns.values(), FIELDS)
+
+
+def backfill_jobruns(apps, schema_editor):
+    JobRun = apps.get_model('django_cd', 'JobRun')
+
+    # Variants from their action runs, then parents from their variants
+    _rollup(JobRun, JobRun.objects.filter(children__isnull=True), 'actionruns')
+    _rollup(JobRun, JobRun.objects.filter(children__isnull=False).distinct(), 'children')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0016_test_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_actionruns, migrations.RunPython.noop),
+        migrations.RunPython(backfill_jobruns, migrations.RunPython.noop),
+    ]
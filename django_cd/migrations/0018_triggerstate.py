@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0017_backfill_test_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TriggerState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('trigger', models.CharField(max_length=255)),
+                ('fired_on', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'trigger'), name='unique_trigger_state')],
+            },
+        ),
+    ]
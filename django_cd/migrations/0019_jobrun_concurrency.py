@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0018_triggerstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='concurrency_key',
+            field=models.CharField(max_length=255, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='actionrun',
+            name='state',
+            field=models.CharField(choices=[('not started', 'Not Started'), ('pending', 'Pending'), ('running', 'Running'), ('error', 'Error'), ('failed', 'Failed'), ('success', 'Success'), ('skipped', 'Skipped')], default='not started', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='jobrun',
+            name='state',
+            field=models.CharField(choices=[('not started', 'Not Started'), ('pending', 'Pending'), ('running', 'Running'), ('error', 'Error'), ('failed', 'Failed'), ('success', 'Success'), ('skipped', 'Skipped')], default='not started', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='testresult',
+            name='state',
+            field=models.CharField(choices=[('not started', 'Not Started'), ('pending', 'Pending'), ('running', 'Running'), ('error', 'Error'), ('failed', 'Failed'), ('success', 'Success'), ('skipped', 'Skipped')], default='not started', max_length=12),
+        ),
+    ]
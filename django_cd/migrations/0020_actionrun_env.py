@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_cd', '0019_jobrun_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionrun',
+            name='env',
+            field=models.JSONField(default=dict),
+        ),
+    ]
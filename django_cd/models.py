@@ -1,17 +1,20 @@
 """"""
 
 # Standard library modules.
+import datetime
 
 # Third party modules.
 from django.db import models
 
 # Local modules.
+from .fields import CompressedTextField
 
 # Globals and constants variables.
 
 
 class RunState(models.TextChoices):
     NOT_STARTED = "not started"
+    PENDING = "pending"
     RUNNING = "running"
     ERROR = "error"
     FAILED = "failed"
@@ -19,16 +22,55 @@ class RunState(models.TextChoices):
     SKIPPED = "skipped"
 
 
-class JobRun(models.Model):
+class TestCounters(models.Model):
+    tests_passed = models.PositiveIntegerField(default=0)
+    tests_failed = models.PositiveIntegerField(default=0)
+    tests_error = models.PositiveIntegerField(default=0)
+    tests_skipped = models.PositiveIntegerField(default=0)
+    tests_duration = models.DurationField(default=datetime.timedelta)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def tests_total(self):
+        return (
+            self.tests_passed
+            + self.tests_failed
+            + self.tests_error
+            + self.tests_skipped
+        )
+
+
+TEST_COUNTER_FIELDS = {
+    RunState.SUCCESS: "tests_passed",
+    RunState.FAILED: "tests_failed",
+    RunState.ERROR: "tests_error",
+    RunState.SKIPPED: "tests_skipped",
+}
+
+
+class JobRun(TestCounters):
     name = models.CharField(max_length=255)
     started_on = models.DateTimeField(auto_now_add=True)
     duration = models.DurationField(null=True)
     state = models.CharField(
         max_length=12, choices=RunState.choices, default=RunState.NOT_STARTED
     )
+    parent = models.ForeignKey(
+        "self", on_delete=models.CASCADE, null=True, related_name="children"
+    )
+    concurrency_key = models.CharField(max_length=255, null=True, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["name", "-started_on"], name="djangocd_job_name_started"
+            )
+        ]
 
 
-class ActionRun(models.Model):
+class ActionRun(TestCounters):
     name = models.CharField(max_length=255)
     jobrun = models.ForeignKey(
         JobRun, on_delete=models.CASCADE, related_name="actionruns"
@@ -38,7 +80,86 @@ class ActionRun(models.Model):
     state = models.CharField(
         max_length=12, choices=RunState.choices, default=RunState.NOT_STARTED
     )
-    output = models.TextField(null=True)
+    revision = models.CharField(max_length=64, null=True)
+    cpu_user_time = models.DurationField(null=True)
+    cpu_system_time = models.DurationField(null=True)
+    max_rss = models.PositiveBigIntegerField(null=True)
+    io_read_blocks = models.PositiveBigIntegerField(null=True)
+    io_write_blocks = models.PositiveBigIntegerField(null=True)
+    voluntary_context_switches = models.PositiveBigIntegerField(null=True)
+    involuntary_context_switches = models.PositiveBigIntegerField(null=True)
+    inputs_hash = models.CharField(max_length=64, null=True, db_index=True)
+    env = models.JSONField(default=dict)
+    cached_from = models.ForeignKey(
+        "self", on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["name", "-started_on"], name="djangocd_action_name_started"
+            )
+        ]
+
+    @property
+    def output(self):
+        return "".join(chunk.text for chunk in self.outputchunks.all())
+
+    def read_output(self, offset=0):
+        start = (
+            self.outputchunks.filter(offset__lte=offset)
+            .order_by("-offset")
+            .values_list("offset", flat=True)
+            .first()
+        )
+        if start is None:
+            start = 0
+
+        text = "".join(
+            chunk.text
+            for chunk in self.outputchunks.filter(offset__gte=start).only("text")
+        )
+        return text[offset - start :], max(offset, start + len(text))
+
+
+class OutputChunk(models.Model):
+    actionrun = models.ForeignKey(
+        ActionRun, on_delete=models.CASCADE, related_name="outputchunks"
+    )
+    offset = models.PositiveBigIntegerField()
+    text = CompressedTextField()
+
+    class Meta:
+        ordering = ["offset"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["actionrun", "offset"], name="unique_outputchunk_offset"
+            )
+        ]
+
+
+class ActionSpan(models.Model):
+    actionrun = models.ForeignKey(
+        ActionRun, on_delete=models.CASCADE, related_name="spans"
+    )
+    name = models.CharField(max_length=255)
+    started_on = models.DateTimeField()
+    duration = models.DurationField()
+
+    class Meta:
+        ordering = ["started_on", "id"]
+
+
+class Artifact(models.Model):
+    actionrun = models.ForeignKey(
+        ActionRun, on_delete=models.CASCADE, related_name="artifacts"
+    )
+    path = models.CharField(max_length=1024)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+
+    class Meta:
+        ordering = ["path"]
 
 
 class TestResult(models.Model):
@@ -50,4 +171,28 @@ class TestResult(models.Model):
         max_length=12, choices=RunState.choices, default=RunState.NOT_STARTED
     )
     duration = models.DurationField()
-    output = models.TextField(null=True)
+    output = CompressedTextField(null=True)
+
+
+class Metric(models.Model):
+    name = models.CharField(max_length=255)
+    labels = models.CharField(max_length=512, blank=True, default="")
+    value = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["name", "labels"], name="unique_metric")
+        ]
+
+
+class TriggerState(models.Model):
+    name = models.CharField(max_length=255)
+    trigger = models.CharField(max_length=255)
+    fired_on = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "trigger"], name="unique_trigger_state"
+            )
+        ]
@@ -0,0 +1,168 @@
+""""""
+
+# Standard library modules.
+import datetime
+
+# Third party modules.
+from django.db import connection
+from django.utils import timezone
+from loguru import logger
+
+# Local modules.
+from .models import (
+    JobRun,
+    ActionRun,
+    ActionSpan,
+    OutputChunk,
+    TestResult,
+    Artifact,
+    RunState,
+)
+from .signals import invalidate_jobruns
+
+# Globals and constants variables.
+BATCH_SIZE = 500
+ACTIVE_STATES = (RunState.NOT_STARTED, RunState.PENDING, RunState.RUNNING)
+STALE_TIMEOUT = 24 * 3600
+FAILED_STATES = (RunState.FAILED, RunState.ERROR)
+
+
+class RetentionPolicy:
+    def __init__(self, runs=None, days=None):
+        if runs is None and days is None:
+            raise ValueError("Retention requires runs and/or days")
+        if runs is not None and runs < 1:
+            raise ValueError(f"Retention runs must be positive: {runs}")
+        if days is not None and days < 0:
+            raise ValueError(f"Retention days must be positive: {days}")
+
+        self.runs = runs
+        self.days = days
+
+    def __str__(self):
+        limits = []
+        if self.runs is not None:
+            limits.append(f"{self.runs} runs")
+        if self.days is not None:
+            limits.append(f"{self.days} days")
+        return f"retention ({' or '.join(limits)})"
+
+    def find_expired(self, jobname):
+        queryset = (
+            JobRun.objects.filter(name=jobname, parent__isnull=True)
+            .exclude(state__in=ACTIVE_STATES)
+            .order_by("-started_on", "-id")
+        )
+
+        # Runs kept by count or age
+        keep_ids = set()
+        if self.runs is not None:
+            keep_ids.update(queryset.values_list("id", flat=True)[: self.runs])
+        if self.days is not None:
+            since = timezone.now() - datetime.timedelta(days=self.days)
+            keep_ids.update(
+                queryset.filter(started_on__gte=since).values_list("id", flat=True)
+            )
+
+        # Always keep last success and last failure
+        for states in [(RunState.SUCCESS,), FAILED_STATES]:
+            jobrun_id = (
+                queryset.filter(state__in=states).values_list("id", flat=True).first()
+            )
+            if jobrun_id is not None:
+                keep_ids.add(jobrun_id)
+
+        return [
+            jobrun_id
+            for jobrun_id in queryset.values_list("id", flat=True)
+            if jobrun_id not in keep_ids
+        ]
+
+
+def release_stale_jobruns(timeout=STALE_TIMEOUT):
+    # Runs left pending or running by a lost task or a killed worker
+    since = timezone.now() - datetime.timedelta(seconds=timeout)
+    count = JobRun.objects.filter(
+        state__in=(RunState.PENDING, RunState.RUNNING), started_on__lt=since
+    ).update(state=RunState.ERROR, concurrency_key=None)
+
+    if count:
+        invalidate_jobruns()
+        logger.warning(f"Released {count} stale job runs")
+    return count
+
+
+def _chunks(values, size):
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+def _execute_in(sql, model, column, ids):
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(column)
+    placeholders = ", ".join(["%s"] * len(ids))
+
+    # Statements are committed one at a time to keep locks short
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(table=table, column=column, ids=placeholders), ids)
+        return cursor.rowcount
+
+
+def _delete_in(model, column, ids):
+    return _execute_in(
+        "DELETE FROM {table} WHERE {column} IN ({ids})", model, column, ids
+    )
+
+
+def _delete_children(model, actionrun_ids, batch_size):
+    count = 0
+    while True:
+        ids = list(
+            model.objects.filter(actionrun_id__in=actionrun_ids).values_list(
+                "id", flat=True
+            )[:batch_size]
+        )
+        if not ids:
+            return count
+
+        count += _delete_in(model, "id", ids)
+
+
+def delete_jobruns(jobrun_ids, batch_size=BATCH_SIZE):
+    # Include variant runs, deleted before their parent
+    ids = list(jobrun_ids)
+    parent_ids = ids
+    while parent_ids:
+        parent_ids = list(
+            JobRun.objects.filter(parent_id__in=parent_ids).values_list("id", flat=True)
+        )
+        ids = parent_ids + ids
+
+    count = 0
+    for jobrun_ids in _chunks(ids, batch_size):
+        actionrun_ids = list(
+            ActionRun.objects.filter(jobrun_id__in=jobrun_ids).values_list(
+                "id", flat=True
+            )
+        )
+
+        for actionrun_ids in _chunks(actionrun_ids, batch_size):
+            for model in [TestResult, OutputChunk, ActionSpan, Artifact]:
+                _delete_children(model, actionrun_ids, batch_size)
+
+            _execute_in(
+                "UPDATE {table} SET {column} = NULL WHERE {column} IN ({ids})",
+                ActionRun,
+                "cached_from_id",
+                actionrun_ids,
+            )
+            _delete_in(ActionRun, "id", actionrun_ids)
+
+        count += _delete_in(JobRun, "id", jobrun_ids)
+
+    # Raw deletes bypass the post_delete signal
+    if count:
+        invalidate_jobruns()
+
+    logger.debug(f"Deleted {count} job runs")
+    return count
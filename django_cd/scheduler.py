@@ -0,0 +1,111 @@
+""""""
+
+# Standard library modules.
+import heapq
+import itertools
+import threading
+
+# Third party modules.
+from django.db import close_old_connections
+from django.utils import timezone
+from loguru import logger
+
+# Local modules.
+from .models import TriggerState
+
+# Globals and constants variables.
+MAX_SLEEP = 60.0
+
+
+class Scheduler:
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def load(self, jobs, now=None):
+        if now is None:
+            now = timezone.now()
+
+        # Last fire times are persisted to survive restarts
+        fired = dict(
+            ((state.name, state.trigger), state.fired_on)
+            for state in TriggerState.objects.all()
+        )
+
+        entries = {}
+        for job in jobs:
+            for trigger in job.triggers:
+                if not hasattr(trigger, "next_after"):
+                    continue
+
+                key = (job.name, str(trigger))
+                if key in entries:
+                    continue
+
+                # Fires missed while stopped are coalesced into one
+                fired_on = fired.get(key)
+                if fired_on is None:
+                    fire_on = trigger.next_after(now)
+                else:
+                    fire_on = max(trigger.next_after(fired_on), now)
+
+                entries[key] = [fire_on, next(self._counter), job, trigger]
+
+        self._heap = list(entries.values())
+        heapq.heapify(self._heap)
+        logger.debug(f"Scheduled {len(self._heap)} trigger(s)")
+
+    @property
+    def nextrun(self):
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def timeout(self, now=None):
+        if not self._heap:
+            return MAX_SLEEP
+        if now is None:
+            now = timezone.now()
+
+        # Capped to follow clock changes
+        delay = (self._heap[0][0] - now).total_seconds()
+        return min(max(delay, 0.0), MAX_SLEEP)
+
+    def run_pending(self, now=None):
+        if now is None:
+            now = timezone.now()
+
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_on, _, job, trigger = self._heap[0]
+
+            # Errors must not stop the scheduler, the fire is skipped
+            logger.debug(f"Trigger {trigger} of job {job.name} fired")
+            try:
+                job.enqueue(fire_on, trigger.skip_unchanged)
+                TriggerState.objects.update_or_create(
+                    name=job.name, trigger=str(trigger), defaults={"fired_on": fire_on}
+                )
+                fired.append((job.name, fire_on))
+            except Exception:
+                logger.exception(f"While firing trigger {trigger} of job {job.name}")
+
+            # Fires skipped while late are not caught up
+            entry = [trigger.next_after(now), next(self._counter), job, trigger]
+            heapq.heapreplace(self._heap, entry)
+
+        return fired
+
+    def run(self, stop=None):
+        if stop is None:
+            stop = threading.Event()
+
+        while not stop.is_set():
+            self.run_pending()
+
+            # Long running process, drop connections that may have been lost
+            close_old_connections()
+            stop.wait(self.timeout())
@@ -0,0 +1,45 @@
+""""""
+
+# Standard library modules.
+import uuid
+
+# Third party modules.
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+# Local modules.
+from .models import JobRun
+
+# Globals and constants variables.
+JOBRUNS_VERSION_KEY = "django_cd:jobruns:version"
+JOBRUNS_CACHE_TIMEOUT = 60
+
+
+def get_cache_timeout():
+    return getattr(settings, "JOBRUNS_CACHE_TIMEOUT", JOBRUNS_CACHE_TIMEOUT)
+
+
+def invalidate_jobruns():
+    version = (uuid.uuid4().hex, timezone.now())
+    cache.set(JOBRUNS_VERSION_KEY, version, get_cache_timeout())
+    return version
+
+
+def get_jobruns_version():
+    # The version expires with the cache timeout, so a cache that is not
+    # shared between processes only serves stale grids for that long
+    version = cache.get(JOBRUNS_VERSION_KEY)
+    if version is None:
+        version = (uuid.uuid4().hex, timezone.now())
+        if not cache.add(JOBRUNS_VERSION_KEY, version, get_cache_timeout()):
+            version = cache.get(JOBRUNS_VERSION_KEY, version)
+    return version
+
+
+@receiver(post_save, sender=JobRun)
+@receiver(post_delete, sender=JobRun)
+def jobrun_changed(sender, **kwargs):
+    invalidate_jobruns()
@@ -1,26 +1,118 @@
 """"""
 
 # Standard library modules.
+import copy
 
 # Third party modules.
 import huey
-from huey.contrib.djhuey import db_task
+from huey.contrib.djhuey import db_task, db_periodic_task
+from django.apps import apps
 from django.conf import settings
+from django.utils import timezone
+from loguru import logger
 
 # Local modules.
+from . import metrics
+from .models import JobRun, RunState
+from .retention import STALE_TIMEOUT, release_stale_jobruns
+from .signals import invalidate_jobruns
 
 # Globals and constants variables.
+PRUNE_SCHEDULE = "0 * * * *"
+RETRY_DELAY = 60
 
 
-@db_task()
-def run_job(job):
-    job.run()
+def _observe_latency(scheduled_on):
+    latency = (timezone.now() - scheduled_on).total_seconds()
+    metrics.observe(
+        metrics.SCHEDULE_LATENCY, max(latency, 0.0), buckets=metrics.LATENCY_BUCKETS
+    )
+
+
+def get_job(name, digest=None):
+    app = apps.get_app_config("django_cd")
+
+    # Definition changed since the task was enqueued, reload job files
+    job = app.jobs.get(name)
+    if job is not None and digest is not None and job.digest != digest:
+        job = app.reload_jobs().get(name)
+        if job is not None and job.digest != digest:
+            logger.warning(f"Job {name} definition differs from enqueued version")
+
+    if job is None:
+        logger.error(f"Job {name} not found")
+    return job
+
+
+def _release_pending(jobrun):
+    # Pending run that never started would block later runs
+    if jobrun is None:
+        return
+
+    count = JobRun.objects.filter(pk=jobrun.pk, state=RunState.PENDING).update(
+        state=RunState.ERROR, concurrency_key=None
+    )
+    if count:
+        invalidate_jobruns()
 
 
 @db_task()
-def schedule_job(job, expr):
-    if not hasattr(settings, "HUEY"):
-        raise RuntimeError("HUEY is not defined in settings")
+def run_job(name, digest=None, scheduled_on=None, skip_unchanged=False, jobrun_id=None):
+    jobrun = None
+    if jobrun_id is not None:
+        jobrun = JobRun.objects.filter(pk=jobrun_id).first()
+        if jobrun is None:
+            logger.info(f"Job {name} run #{jobrun_id} no longer exists")
+            return
+
+    job = get_job(name, digest)
+    if job is None:
+        _release_pending(jobrun)
+        return
+
+    if scheduled_on is not None:
+        _observe_latency(scheduled_on)
+
+    # Actions keep per-run state, concurrent runs must not share them
+    job = copy.deepcopy(job)
+    try:
+        job.run(skip_unchanged=skip_unchanged, jobrun=jobrun)
+    except Exception:
+        _release_pending(jobrun)
+        raise
+
+    # Another run of the job was running, retried once it may have finished
+    if (
+        jobrun is not None
+        and JobRun.objects.filter(pk=jobrun.pk, state=RunState.PENDING).exists()
+    ):
+        run_job.schedule(
+            (name, digest, None, skip_unchanged, jobrun.pk),
+            delay=getattr(settings, "JOBRUN_RETRY_DELAY", RETRY_DELAY),
+        )
+
+
+@db_periodic_task(huey.crontab(*PRUNE_SCHEDULE.split(), strict=True))
+def prune_jobs():
+    app = apps.get_app_config("django_cd")
+
+    for job in app.jobs.values():
+        if job.retention is None:
+            continue
+
+        try:
+            job.prune()
+        except Exception:
+            logger.exception(f"While pruning job {job.name}")
+
+
+@db_periodic_task(huey.crontab(*PRUNE_SCHEDULE.split(), strict=True))
+def release_jobruns():
+    release_stale_jobruns(getattr(settings, "STALE_JOBRUN_TIMEOUT", STALE_TIMEOUT))
+
 
-    schedule = huey.crontab(*expr.split(), strict=True)
-    settings.HUEY.periodic_task(schedule, name=job.name)(job.run)
+@db_periodic_task(huey.crontab())
+def export_metrics():
+    filepath = getattr(settings, "METRICS_TEXTFILE", None)
+    if filepath:
+        metrics.write_textfile(filepath)
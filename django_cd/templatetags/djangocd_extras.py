@@ -6,10 +6,9 @@ import datetime
 # Third party modules.
 from django import template
 from django.template.defaultfilters import pluralize
-from django.db.models import Count
 
 # Local modules.
-from django_cd.models import RunState
+from django_cd.models import TEST_COUNTER_FIELDS, RunState
 
 
 # Globals and constants variables.
@@ -24,6 +23,7 @@ backgrounds = {
 
 adjectives = {
     RunState.NOT_STARTED: "not started",
+    RunState.PENDING: "pending",
     RunState.RUNNING: "running",
     RunState.SUCCESS: "succeeded",
     RunState.ERROR: "error",
@@ -44,6 +44,9 @@ def state_adjective(state):
 
 @register.filter
 def duration(value):
+    if value is None:
+        return ""
+
     remainder = value
     response = ""
     days = 0
@@ -99,20 +102,40 @@ def duration(value):
 
 
 @register.filter
-def testresult_summary(actionrun):
-    states = dict(
-        (item["state"], item["count"])
-        for item in actionrun.testresults.values("state").annotate(count=Count("state"))
-    )
-
+def testresult_summary(run):
     response = []
-    for state in [RunState.SUCCESS, RunState.FAILED, RunState.ERROR, RunState.SKIPPED]:
-        if state in states:
-            response.append(f"{states[state]} {adjectives.get(state)}")
+    for state, field in TEST_COUNTER_FIELDS.items():
+        count = getattr(run, field)
+        if count:
+            response.append(f"{count} {adjectives.get(state)}")
 
     return ", ".join(response)
 
 
+@register.filter
+def waterfall(actionrun):
+    spans = list(actionrun.spans.all())
+    if not spans:
+        return []
+
+    start = actionrun.started_on
+    if actionrun.duration is not None:
+        total = actionrun.duration.total_seconds()
+    else:
+        total = max(
+            (span.started_on + span.duration - start).total_seconds() for span in spans
+        )
+    total = max(total, 1e-6)
+
+    response = []
+    for span in spans:
+        left = max((span.started_on - start).total_seconds(), 0.0) / total * 100
+        width = span.duration.total_seconds() / total * 100
+        response.append((span, min(left, 100.0), min(width, 100.0 - min(left, 100.0))))
+
+    return response
+
+
 @register.filter
 def listrange(length, start=0):
     return range(start, start + length)
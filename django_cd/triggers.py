@@ -2,22 +2,55 @@
 
 # Standard library modules.
 import abc
+import datetime
+import hashlib
+import re
 
 # Third party modules.
 from django.utils import timezone
-import huey
 import crontab
 
 # Local modules.
-from .tasks import schedule_job
 
 # Globals and constants variables.
+HASHED_RANGES = [(0, 59), (0, 23), (1, 28), (1, 12), (0, 6)]
+HASHED_PATTERN = re.compile(r"^H(?:\((\d+)-(\d+)\))?(?:/(\d+))?$")
+
+
+def _hash(seed, salt):
+    digest = hashlib.sha256(f"{seed}:{salt}".encode("utf8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def expand_hashed(expr, seed):
+    fields = expr.split()
+
+    for index, bounds in enumerate(HASHED_RANGES[: len(fields)]):
+        items = []
+        for item in fields[index].split(","):
+            match = HASHED_PATTERN.match(item)
+            if not match:
+                items.append(item)
+                continue
+
+            # Same value for a given seed, spread across seeds
+            start, end, step = match.groups()
+            low, high = bounds if start is None else (int(start), int(end))
+            value = _hash(seed, index)
+
+            if step is None:
+                items.append(str(low + value % (high - low + 1)))
+            else:
+                items.append(f"{low + value % int(step)}-{high}/{step}")
+
+        fields[index] = ",".join(items)
+
+    return " ".join(fields)
 
 
 class Trigger(metaclass=abc.ABCMeta):
-    @abc.abstractmethod
-    def register(self, job):
-        raise NotImplementedError
+    def bind(self, job):
+        pass
 
     @abc.abstractproperty
     def nextrun(self):
@@ -25,16 +58,41 @@ class Trigger(metaclass=abc.ABCMeta):
 
 
 class CronTrigger(Trigger):
-    def __init__(self, expr):
+    def __init__(self, expr, skip_unchanged=False, spread=None):
+        if spread is not None and spread < 0:
+            raise ValueError(f"Spread must be positive: {spread}")
+
         self.expr = expr
+        self.skip_unchanged = skip_unchanged
+        self.spread = spread
+        self._seed("")
 
     def __str__(self):
+        if self.spread:
+            return f"cron ({self.expr}, spread {self.spread} min)"
         return f"cron ({self.expr})"
 
-    def register(self, job):
-        schedule_job(job, self.expr)
+    def _seed(self, seed):
+        self._cron = crontab.CronTab(expand_hashed(self.expr, seed))
+        self._nextrun = None
+
+        self._offset = datetime.timedelta(0)
+        if self.spread:
+            self._offset = datetime.timedelta(
+                seconds=_hash(seed, "spread") % (self.spread * 60)
+            )
+
+    def bind(self, job):
+        # Fire times are spread deterministically by job name
+        self._seed(job.name)
+
+    def next_after(self, dt):
+        return self._cron.next(dt - self._offset, return_datetime=True) + self._offset
 
     @property
     def nextrun(self):
-        cron = crontab.CronTab(self.expr)
-        return cron.next(timezone.now(), return_datetime=True)
+        # Memoized until it passes
+        now = timezone.now()
+        if self._nextrun is None or self._nextrun <= now:
+            self._nextrun = self.next_after(now)
+        return self._nextrun
@@ -15,5 +15,9 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("jobruns", views.jobruns, name="jobruns"),
     path("jobruns/<int:id>", views.jobrun, name="jobrun"),
+    path("actionruns/<int:id>/output", views.actionrun_output, name="actionrun_output"),
+    path("artifacts/<int:id>", views.artifact, name="artifact"),
     path("runjob", views.runjob, name="runjob"),
+    path("metrics", views.metrics, name="metrics"),
+    path("forecast", views.forecast, name="forecast"),
 ]
@@ -1,15 +1,35 @@
 """"""
 
 # Standard library modules.
+import datetime
+import hashlib
+import mimetypes
+import posixpath
+import re
 
 # Third party modules.
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.apps import apps
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils import timezone
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
 
 # Local modules.
-from .models import JobRun, RunState
-from .tasks import run_job
+from .actions import READ_SIZE, get_artifact_filepath
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics
+from .models import TEST_COUNTER_FIELDS, ActionRun, Artifact, JobRun, RunState
+from .signals import get_cache_timeout, get_jobruns_version
 
 # Globals and constants variables.
 colors = {
@@ -20,6 +40,9 @@ colors = {
     RunState.RUNNING: "gray-600",
 }
 
+FORECAST_SLOT = datetime.timedelta(minutes=5)
+FORECAST_NRUNS = 10
+
 
 def index(request):
     app = apps.get_app_config("django_cd")
@@ -34,8 +57,101 @@ def index(request):
 
 
 def jobrun(request, id):
-    jobrun = JobRun.objects.get(pk=id)
-    return render(request, "django_cd/jobrun.html", context={"jobrun": jobrun})
+    jobrun = JobRun.objects.select_related("parent").get(pk=id)
+
+    actionruns = (
+        jobrun.actionruns.select_related("cached_from")
+        .prefetch_related("spans", "artifacts", "outputchunks")
+        .order_by("id")
+    )
+
+    return render(
+        request,
+        "django_cd/jobrun.html",
+        context={
+            "jobrun": jobrun,
+            "children": jobrun.children.all(),
+            "actionruns": actionruns,
+        },
+    )
+
+
+def actionrun_output(request, id):
+    try:
+        offset = max(0, int(request.GET.get("offset", 0)))
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    actionrun = ActionRun.objects.only("id", "state").get(pk=id)
+    text, offset = actionrun.read_output(offset)
+
+    return render(
+        request,
+        "django_cd/actionrun_output.html",
+        context={"actionrun": actionrun, "text": text, "offset": offset},
+    )
+
+
+def _read_range(fp, length):
+    with fp:
+        while length > 0:
+            data = fp.read(min(READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def artifact(request, id):
+    artifact = Artifact.objects.get(pk=id)
+    filepath = get_artifact_filepath(artifact.digest)
+    filename = posixpath.basename(artifact.path)
+    etag = f'"{artifact.digest}"'
+
+    if request.headers.get("If-None-Match") == etag:
+        return HttpResponseNotModified(headers={"ETag": etag})
+
+    # Parse single byte range
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("Range", ""))
+    if request.headers.get("If-Range", etag) != etag:
+        match = None
+
+    if match is None or not any(match.groups()):
+        response = FileResponse(
+            open(filepath, "rb"), as_attachment=True, filename=filename
+        )
+        response["Accept-Ranges"] = "bytes"
+        response["ETag"] = etag
+        return response
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), artifact.size - 1) if last else artifact.size - 1
+    else:
+        start = max(0, artifact.size - int(last))
+        end = artifact.size - 1
+
+    if start > end:
+        return HttpResponse(
+            status=416, headers={"Content-Range": f"bytes */{artifact.size}"}
+        )
+
+    fp = open(filepath, "rb")
+    fp.seek(start)
+
+    content_type, _ = mimetypes.guess_type(filename)
+    response = StreamingHttpResponse(
+        _read_range(fp, end - start + 1),
+        status=206,
+        content_type=content_type or "application/octet-stream",
+    )
+    response["Content-Length"] = str(end - start + 1)
+    response["Content-Range"] = f"bytes {start}-{end}/{artifact.size}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    return response
 
 
 def _always_n(iterable, n):
@@ -47,30 +163,54 @@ def _always_n(iterable, n):
             yield None
 
 
+def _get_njobs(request):
+    try:
+        return max(1, int(request.GET.get("njobs", 10)))
+    except ValueError:
+        return 10
+
+
 def _create_jobruns_context(request):
-    njobs = request.GET.get("njobs", 10)
+    njobs = _get_njobs(request)
     app = apps.get_app_config("django_cd")
 
-    jobnames = dict(
-        (n, n)
-        for n in JobRun.objects.order_by("-started_on")
-        .values_list("name", flat=True)
-        .all()
-    ).keys()
-
-    rows = []
-    for name in jobnames:
-        runs = _always_n(
-            JobRun.objects.filter(name=name)
-            .order_by("-started_on")
-            .values_list("id", "started_on", "state", named=True)[:njobs],
-            njobs,
+    # Last runs of every job in a single query, most recent job first
+    queryset = (
+        JobRun.objects.filter(parent__isnull=True)
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F("name"),
+                order_by=[F("started_on").desc(), F("id").desc()],
+            )
+        )
+        .filter(rank__lte=njobs)
+        .order_by("-started_on", "-id")
+        .annotate(
+            tests_total=F("tests_passed")
+            + F("tests_failed")
+            + F("tests_error")
+            + F("tests_skipped")
         )
+        .values_list(
+            "id",
+            "name",
+            "started_on",
+            "state",
+            "tests_total",
+            *TEST_COUNTER_FIELDS.values(),
+            named=True,
+        )
+    )
 
-        job = app.jobs.get(name)
-        nextrun = job.nextrun if job is not None else None
+    jobruns = {}
+    for jobrun in queryset:
+        jobruns.setdefault(jobrun.name, []).append(jobrun)
 
-        rows.append([name, runs, nextrun])
+    rows = []
+    nextruns = app.nextruns
+    for name, runs in jobruns.items():
+        rows.append([name, list(_always_n(runs, njobs)), nextruns.get(name)])
 
     return {
         "njobs": njobs,
@@ -79,11 +219,127 @@ def _create_jobruns_context(request):
     }
 
 
+def _jobruns_etag(request):
+    app = apps.get_app_config("django_cd")
+    version, _last_modified = get_jobruns_version()
+
+    # Next runs change without any job run being saved
+    hasher = hashlib.sha256()
+    hasher.update(f"{version}:{_get_njobs(request)}".encode("utf8"))
+    for name, nextrun in sorted(app.nextruns.items()):
+        hasher.update(f"{name}:{nextrun}".encode("utf8"))
+    return hasher.hexdigest()[:32]
+
+
+def _jobruns_last_modified(request):
+    _version, last_modified = get_jobruns_version()
+    return last_modified
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=_jobruns_etag, last_modified_func=_jobruns_last_modified)
 def jobruns(request):
+    key = f"django_cd:jobruns:{_jobruns_etag(request)}"
+    content = cache.get(key)
+
+    if content is None:
+        content = render_to_string(
+            "django_cd/jobruns.html",
+            context=_create_jobruns_context(request),
+            request=request,
+        )
+        cache.set(key, content, get_cache_timeout())
+
+    return HttpResponse(content)
+
+
+def _get_hours(request):
+    try:
+        return min(max(1, int(request.GET.get("hours", 24))), 168)
+    except ValueError:
+        return 24
+
+
+def _create_forecast_context(request):
+    hours = _get_hours(request)
+    app = apps.get_app_config("django_cd")
+    jobs = dict((name, job) for name, job in app.jobs.items() if job.triggers)
+
+    # Average duration of the last runs of every job in a single query
+    queryset = (
+        JobRun.objects.filter(
+            name__in=jobs.keys(), parent__isnull=True, duration__isnull=False
+        )
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F("name"),
+                order_by=[F("started_on").desc(), F("id").desc()],
+            )
+        )
+        .filter(rank__lte=FORECAST_NRUNS)
+        .values_list("name", "duration")
+    )
+
+    durations = {}
+    for name, duration in queryset:
+        durations.setdefault(name, []).append(duration)
+
+    start = timezone.now().replace(second=0, microsecond=0)
+    end = start + datetime.timedelta(hours=hours)
+    nslots = int((end - start) / FORECAST_SLOT)
+    slots = [[] for _ in range(nslots)]
+
+    rows = []
+    for name, job in sorted(jobs.items()):
+        duration = None
+        if name in durations:
+            duration = sum(durations[name], datetime.timedelta(0)) / len(
+                durations[name]
+            )
+
+        # Jobs never run occupy one slot
+        occupied = duration or FORECAST_SLOT
+
+        nruns = 0
+        for trigger in job.triggers:
+            if not hasattr(trigger, "next_after"):
+                continue
+
+            fire_on = trigger.next_after(start)
+            while fire_on < end:
+                nruns += 1
+
+                # Runs ending on a slot boundary do not occupy the next slot
+                first = int((fire_on - start) / FORECAST_SLOT)
+                last = -(-(fire_on + occupied - start) // FORECAST_SLOT)
+                for index in range(first, min(last, nslots)):
+                    slots[index].append(name)
+
+                fire_on = trigger.next_after(fire_on)
+
+        rows.append([name, job.triggers, duration, nruns])
+
+    load = [
+        (start + index * FORECAST_SLOT, names)
+        for index, names in enumerate(slots)
+        if names
+    ]
+    peak = max((len(names) for names in slots), default=0)
+
+    return {
+        "hours": hours,
+        "rows": rows,
+        "load": load,
+        "peak": peak,
+    }
+
+
+def forecast(request):
     return render(
         request,
-        "django_cd/jobruns.html",
-        context=_create_jobruns_context(request),
+        "django_cd/forecast.html",
+        context=_create_forecast_context(request),
     )
 
 
@@ -95,5 +351,9 @@ def runjob(request):
     if job is None:
         return HttpResponseBadRequest()
 
-    run_job.schedule((job,), delay=0)
+    job.enqueue(timezone.now())
     return HttpResponse(status=204, headers={"HX-Refresh": "true"})
+
+
+def metrics(request):
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
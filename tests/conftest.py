@@ -6,7 +6,10 @@ import tempfile
 import shutil
 
 # Third party modules.
+import pytest
+from django.apps import apps
 from django.conf import settings
+from huey import MemoryHuey
 
 # Local modules.
 
@@ -31,9 +34,11 @@ def pytest_configure():
             "default": {
                 "ENGINE": "django.db.backends.sqlite3",
                 "NAME": tmpdir.joinpath("db.sqlite3"),
+                "TEST": {"NAME": tmpdir.joinpath("test.sqlite3")},
             }
         },
         "ACTIONS": {
+            "artifact-fetch": "django_cd.actions.ArtifactFetchAction",
             "command": "django_cd.actions.CommandAction",
             "git-checkout": "django_cd.actions.GitCheckoutAction",
             "python-run": "django_cd.actions.PythonAction",
@@ -46,6 +51,16 @@ def pytest_configure():
         "NOTIFICATIONS": {
             "email": "django_cd.notifications.EmailNotification",
         },
+        "TEMPLATES": [
+            {
+                "BACKEND": "django.template.backends.django.DjangoTemplates",
+                "APP_DIRS": True,
+            }
+        ],
+        "ROOT_URLCONF": "urls",
+        "STATIC_URL": "/static/",
+        "WORKDIR": tmpdir.joinpath("workdir"),
+        "HUEY": MemoryHuey("django_cd", immediate=True),
     }
 
     settings.configure(DEBUG=True, **extra_settings)
@@ -53,3 +68,21 @@ def pytest_configure():
 
 def pytest_unconfigure():
     shutil.rmtree(tmpdir)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    app = apps.get_app_config("django_cd")
+    monkeypatch.setattr(app, "_jobs", {})
+    monkeypatch.setattr(app, "_nextruns", None)
+    return app._jobs
+
+
+@pytest.fixture
+def queue(settings):
+    huey = settings.HUEY
+    huey.immediate = False
+    try:
+        yield huey
+    finally:
+        huey.immediate = True
@@ -1,18 +1,30 @@
 """"""
 
 # Standard library modules.
+import os
+import subprocess
+import sys
+import threading
+import time
 
 # Third party modules.
 import pytest
 
 # Local modules.
+from django_cd import actions
 from django_cd.jobs import Job
 from django_cd.actions import (
+    Action,
+    ActionOutput,
+    ArtifactFetchAction,
     CommandAction,
     GitCheckoutAction,
     PythonAction,
     PythonPytestAction,
     PythonVirtualEnvAction,
+    _balance_shards,
+    _run_command,
+    ShardOutput,
 )
 from django_cd.models import JobRun, ActionRun, RunState
 
@@ -41,3 +53,437 @@ def test_action(tmp_path):
     assert jobrun.state == RunState.SUCCESS
 
     assert ActionRun.objects.count() == 5
+
+
+@pytest.mark.django_db
+def test_command_action_output(tmp_path):
+    action = CommandAction("command", 'echo "hello"')
+    job = Job("test", tmp_path, actions=[action])
+    job.run()
+
+    actionrun = ActionRun.objects.first()
+    assert actionrun.state == RunState.SUCCESS
+    assert actionrun.output.splitlines() == ["> echo hello", "hello"]
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(not hasattr(os, "wait4"), reason="requires os.wait4")
+@pytest.mark.parametrize(
+    "exitcode,state", [(0, RunState.SUCCESS), (3, RunState.FAILED)]
+)
+def test_command_action_resource_usage(tmp_path, exitcode, state):
+    script = f"x = bytearray(64 * 1024 * 1024); sum(range(10**6)); exit({exitcode})"
+    action = CommandAction("command", f"{sys.executable} -c '{script}'")
+    job = Job("test", tmp_path, actions=[action])
+    job.run()
+
+    actionrun = ActionRun.objects.get()
+    assert actionrun.state == state
+    assert actionrun.cpu_user_time.total_seconds() > 0
+    assert actionrun.cpu_system_time is not None
+    assert actionrun.max_rss >= 64 * 1024 * 1024
+    assert actionrun.io_read_blocks >= 0
+    assert actionrun.voluntary_context_switches >= 0
+
+
+class SpanAction(Action):
+    def _run(self, workdir, outputs, env):
+        with self.span("first"):
+            time.sleep(0.01)
+        with self.span("second"):
+            raise RuntimeError("boom")
+
+
+@pytest.mark.django_db
+def test_action_span(tmp_path):
+    action = SpanAction("spans")
+    job = Job("test", tmp_path, actions=[action])
+    jobrun = job.run()
+
+    actionrun = jobrun.actionruns.get()
+    assert actionrun.state == RunState.ERROR
+
+    first, second = actionrun.spans.all()
+    assert first.name == "first"
+    assert first.duration.total_seconds() >= 0.01
+    assert first.started_on >= actionrun.started_on
+    assert second.name == "second"
+    assert second.started_on >= first.started_on + first.duration
+
+
+@pytest.mark.django_db
+def test_action_output_flush_while_silent(tmp_path):
+    jobrun = JobRun.objects.create(name="test")
+    actionrun = ActionRun.objects.create(name="action", jobrun=jobrun)
+
+    outputs = ActionOutput(actionrun, flush_interval=0.1)
+    args = ["sh", "-c", "echo first; sleep 1; echo second"]
+    _run_command(args, tmp_path, outputs, {})
+    outputs.flush()
+
+    # Text before the silence is flushed on its own
+    texts = [chunk.text for chunk in actionrun.outputchunks.order_by("offset")]
+    assert texts[0].endswith("first\n")
+    assert "".join(texts).endswith("second\n")
+
+
+@pytest.mark.django_db
+def test_shard_output():
+    jobrun = JobRun.objects.create(name="test")
+    actionrun = ActionRun.objects.create(name="action", jobrun=jobrun)
+
+    outputs = ActionOutput(actionrun, flush_interval=0.0)
+    lock = threading.Lock()
+    shard1 = ShardOutput(outputs, "shard 1", lock)
+    shard2 = ShardOutput(outputs, "shard 2", lock)
+
+    shard1.write("a\npar")
+    shard2.append("b")
+    shard1.write("tial\n")
+    shard1.write("last")
+    shard1.flush()
+
+    # Written as it arrives, one complete line at a time
+    assert actionrun.output.splitlines() == [
+        "[shard 1] a",
+        "[shard 2] b",
+        "[shard 1] partial",
+        "[shard 1] last",
+    ]
+
+
+@pytest.mark.django_db
+def test_action_output_chunks():
+    jobrun = JobRun.objects.create(name="test")
+    actionrun = ActionRun.objects.create(name="action", jobrun=jobrun)
+
+    outputs = ActionOutput(actionrun, chunk_size=64)
+    for i in range(100):
+        outputs.append(f"line {i}")
+    outputs.write("partial")
+    outputs.append("last")
+    outputs.flush()
+
+    assert actionrun.outputchunks.count() > 1
+    assert actionrun.output.splitlines() == [f"line {i}" for i in range(100)] + [
+        "partial",
+        "last",
+    ]
+
+
+def test_balance_shards():
+    nodeids = [
+        "tests/test_a.py::test_slow",
+        "tests/test_a.py::TestA::test_medium[1]",
+        "tests/test_b.py::test_fast",
+        "tests/test_b.py::test_unknown",
+    ]
+    durations = {
+        "tests.test_a.test_slow": 10.0,
+        "tests.test_a.TestA.test_medium[1]": 6.0,
+        "tests.test_b.test_fast": 1.0,
+    }
+
+    shards = _balance_shards(nodeids, durations, 2)
+
+    assert shards == [
+        ["tests/test_a.py::test_slow", "tests/test_b.py::test_fast"],
+        ["tests/test_b.py::test_unknown", "tests/test_a.py::TestA::test_medium[1]"],
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_python_pytest_action_shards(tmp_path):
+    tmp_path.joinpath("test_example.py").write_text(
+        "import pytest\n"
+        "@pytest.mark.parametrize('i', range(10))\n"
+        "def test_pass(i):\n"
+        "    pass\n"
+        "def test_fail():\n"
+        "    assert False\n"
+    )
+
+    action = PythonPytestAction("pytest", args="test_example.py", shards=3)
+    job = Job("test", tmp_path, actions=[action])
+    jobrun = job.run()
+
+    assert jobrun.state == RunState.FAILED
+
+    actionrun = ActionRun.objects.get()
+    assert "Running 11 tests in 3 shards" in actionrun.output
+    lines = actionrun.output.splitlines()
+    for i in range(1, 4):
+        assert any(line.startswith(f"[shard {i}] > ") for line in lines)
+    assert actionrun.cpu_user_time.total_seconds() > 0
+    assert actionrun.testresults.count() == 11
+    assert actionrun.testresults.filter(state=RunState.FAILED).count() == 1
+
+    # Balanced using the durations of the previous run
+    jobrun = job.run()
+    assert jobrun.actionruns.get().testresults.count() == 11
+
+
+@pytest.mark.django_db
+def test_python_pytest_action_parse_junitxml(tmp_path, django_assert_max_num_queries):
+    testcases = [
+        f'<testcase classname="tests.test_a" name="test_{i}" time="0.5"/>'
+        for i in range(2500)
+    ]
+    testcases += [
+        '<testcase classname="tests.test_b" name="test_error" time="1">'
+        '<error message="error">traceback</error></testcase>',
+        '<testcase classname="tests.test_b" name="test_failure" time="1">'
+        '<failure message="failure">assert False</failure></testcase>',
+        '<testcase classname="tests.test_b" name="test_skipped" time="0">'
+        '<skipped message="skip">reason</skipped></testcase>',
+    ]
+    filepath = tmp_path.joinpath("junit.xml")
+    filepath.write_text(
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f'<testsuites><testsuite name="pytest">{"".join(testcases)}</testsuite></testsuites>'
+    )
+
+    jobrun = JobRun.objects.create(name="test")
+    action = PythonPytestAction("pytest")
+    action._actionrun = ActionRun.objects.create(name="pytest", jobrun=jobrun)
+
+    with django_assert_max_num_queries(30):
+        action._parse_junitxml(filepath)
+
+    testresults = action._actionrun.testresults
+    assert testresults.count() == 2503
+    assert testresults.filter(state=RunState.SUCCESS).count() == 2500
+
+    testresult = testresults.get(name="tests.test_b.test_failure")
+    assert testresult.state == RunState.FAILED
+    assert testresult.output == "assert False"
+    assert testresult.duration.total_seconds() == 1.0
+
+    # Counters are kept in sync with the test results
+    actionrun = ActionRun.objects.get(pk=action._actionrun.pk)
+    assert actionrun.tests_passed == 2500
+    assert actionrun.tests_failed == 1
+    assert actionrun.tests_error == 1
+    assert actionrun.tests_skipped == 1
+    assert actionrun.tests_total == 2503
+    assert actionrun.tests_duration.total_seconds() == 1252.0
+
+
+@pytest.mark.django_db
+def test_python_virtualenv_action_cache(tmp_path, settings):
+    settings.CACHEDIR = tmp_path.joinpath("cache")
+    tmp_path.joinpath("requirements.txt").write_text("# No requirements\n")
+
+    for name in ["job1", "job2"]:
+        workdir = tmp_path.joinpath(name)
+        workdir.mkdir()
+
+        actions = [
+            PythonVirtualEnvAction(
+                "venv",
+                relpath="env",
+                requirements=["../../requirements.txt"],
+                cache=True,
+            ),
+            PythonAction("python", "-c 'import sys; print(sys.prefix)'"),
+        ]
+        job = Job(name, workdir, actions=actions)
+        jobrun = job.run()
+        assert jobrun.state == RunState.SUCCESS
+
+    assert len(list(settings.CACHEDIR.joinpath("venv").iterdir())) == 1
+
+    venv_actionrun, python_actionrun = jobrun.actionruns.order_by("id")
+    assert "Using cached environment" in venv_actionrun.output
+    assert str(tmp_path.joinpath("job2", "env")) in python_actionrun.output
+
+
+def _git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        + list(args),
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def upstream_repos(tmp_path):
+    reposdir = tmp_path.joinpath("upstream", "example.git")
+    reposdir.mkdir(parents=True)
+    _git(reposdir, "init", "-b", "main")
+    reposdir.joinpath("README").write_text("v1")
+    _git(reposdir, "add", "README")
+    _git(reposdir, "commit", "-m", "v1")
+    return reposdir
+
+
+@pytest.mark.django_db
+def test_git_checkout_action_mirror(tmp_path, settings, upstream_repos):
+    settings.CACHEDIR = tmp_path.joinpath("cache")
+
+    for name in ["job1", "job2"]:
+        workdir = tmp_path.joinpath(name)
+        workdir.mkdir()
+
+        action = GitCheckoutAction(
+            "checkout", str(upstream_repos), branch="main", mirror=True
+        )
+        job = Job(name, workdir, actions=[action])
+        jobrun = job.run()
+        assert jobrun.state == RunState.SUCCESS
+
+        upstream_repos.joinpath("README").write_text(f"after {name}")
+        _git(upstream_repos, "commit", "-am", f"after {name}")
+
+    mirrordirs = list(settings.CACHEDIR.joinpath("git").glob("*.git"))
+    assert len(mirrordirs) == 1
+
+    reposdir = tmp_path.joinpath("job2", "example")
+    assert reposdir.joinpath("README").read_text() == "after job1"
+
+    alternates = reposdir.joinpath(".git", "objects", "info", "alternates")
+    assert alternates.read_text().strip() == str(mirrordirs[0].joinpath("objects"))
+
+
+@pytest.mark.django_db
+def test_git_checkout_action_revision(tmp_path, upstream_repos):
+    action = GitCheckoutAction("checkout", str(upstream_repos), branch="main")
+    job = Job("test", tmp_path, actions=[action])
+    jobrun = job.run()
+
+    revision = jobrun.actionruns.get().revision
+    assert len(revision) == 40
+    assert action.upstream_revision() == revision
+
+    spans = jobrun.actionruns.get().spans.values_list("name", flat=True)
+    assert list(spans) == ["clone", "clean", "checkout", "pull"]
+
+
+@pytest.mark.django_db
+def test_action_inputs_cache(tmp_path):
+    tmp_path.joinpath("doc.txt").write_text("v1")
+
+    action = CommandAction("build", "echo building")
+    action.inputs = {"files": ["*.txt"], "env": ["revision"]}
+    job = Job("test", tmp_path, actions=[action])
+
+    first = job.run().actionruns.get()
+    assert first.cached_from is None
+    assert "building" in first.output
+
+    second = job.run().actionruns.get()
+    assert second.state == RunState.SUCCESS
+    assert second.cached_from == first
+    assert second.inputs_hash == first.inputs_hash
+    assert "building" not in second.output
+
+    tmp_path.joinpath("doc.txt").write_text("v2")
+    third = job.run().actionruns.get()
+    assert third.cached_from is None
+    assert third.inputs_hash != first.inputs_hash
+
+
+class EnvAction(Action):
+    def _run(self, workdir, outputs, env):
+        env["PYTHON_EXE"] = "/opt/python"
+        self._actionrun.revision = "abc"
+        return RunState.SUCCESS
+
+
+@pytest.mark.django_db
+def test_action_inputs_cache_env(tmp_path):
+    action = EnvAction("setup")
+    action.inputs = {"files": ["*.txt"]}
+    job = Job(
+        "test", tmp_path, actions=[action, CommandAction("echo", "echo $PYTHON_EXE")]
+    )
+
+    first = job.run()
+    second = job.run()
+
+    # Changes to env and revision are replayed from the cached run
+    for jobrun in [first, second]:
+        setup, echo = jobrun.actionruns.order_by("id")
+        assert setup.env == {"PYTHON_EXE": "/opt/python"}
+        assert setup.revision == "abc"
+        assert echo.output.splitlines()[-1] == "/opt/python"
+
+    assert second.actionruns.order_by("id").first().cached_from is not None
+
+
+@pytest.mark.django_db
+def test_action_artifacts(tmp_path, settings):
+    settings.CACHEDIR = tmp_path.joinpath("cache")
+    workdir = tmp_path.joinpath("build")
+    workdir.mkdir()
+
+    action1 = CommandAction("build1", "sh -c 'mkdir -p dist && echo data > dist/a.txt'")
+    action1.artifacts = ["dist/*.txt"]
+    action2 = CommandAction("build2", "sh -c 'echo data > b.txt'")
+    action2.artifacts = ["*.txt"]
+    job = Job("build", workdir, actions=[action1, action2])
+    jobrun = job.run()
+    assert jobrun.state == RunState.SUCCESS
+
+    actionrun1, actionrun2 = jobrun.actionruns.order_by("id")
+    assert list(actionrun1.artifacts.values_list("path", "size")) == [("dist/a.txt", 5)]
+    assert actionrun1.artifacts.get().digest == actionrun2.artifacts.get().digest
+
+    blobs = [
+        p for p in settings.CACHEDIR.joinpath("artifacts").rglob("*") if p.is_file()
+    ]
+    assert len(blobs) == 1
+
+    # Fetch from another job
+    fetchdir = tmp_path.joinpath("deploy")
+    action = ArtifactFetchAction("fetch", action="build1", job="build")
+    jobrun = Job("deploy", fetchdir, actions=[action]).run()
+    assert jobrun.state == RunState.SUCCESS
+
+    filepath = fetchdir.joinpath("dist", "a.txt")
+    assert filepath.read_text() == "data\n"
+    assert filepath.stat().st_ino == blobs[0].stat().st_ino
+
+
+@pytest.mark.django_db
+def test_artifact_fetch_action_same_job(tmp_path, settings):
+    settings.CACHEDIR = tmp_path.joinpath("cache")
+
+    build = CommandAction("build", "sh -c 'echo data > a.txt'")
+    build.artifacts = ["*.txt"]
+    fetch = ArtifactFetchAction("fetch", action="build", relpath="deploy")
+    jobrun = Job("test", tmp_path, actions=[build, fetch]).run()
+    assert jobrun.state == RunState.SUCCESS
+    assert tmp_path.joinpath("deploy", "a.txt").read_text() == "data\n"
+
+    # No artifact stored by the action
+    build = CommandAction("build", "echo nothing")
+    fetch = ArtifactFetchAction("fetch", action="build", relpath="deploy")
+    jobrun = Job("test", tmp_path, actions=[build, fetch]).run()
+    assert jobrun.state == RunState.FAILED
+    assert "No artifact stored" in jobrun.actionruns.get(name="fetch").output
+
+
+@pytest.mark.django_db
+def test_action_inputs_cache_artifacts(tmp_path, settings, monkeypatch):
+    settings.CACHEDIR = tmp_path.joinpath("cache")
+    tmp_path.joinpath("src.txt").write_text("v1")
+
+    action = CommandAction("build", "sh -c 'mkdir -p dist && cp src.txt dist/'")
+    action.inputs = {"files": ["src.txt"]}
+    action.artifacts = ["dist/*.txt"]
+    job = Job("test", tmp_path, actions=[action])
+    first = job.run().actionruns.get()
+
+    # Cached artifacts are not stored again
+    def store_artifact(filepath):
+        raise AssertionError("artifact stored again")
+
+    monkeypatch.setattr(actions, "store_artifact", store_artifact)
+    second = job.run().actionruns.get()
+    assert second.cached_from == first
+    assert list(second.artifacts.values_list("path", "digest", "size")) == list(
+        first.artifacts.values_list("path", "digest", "size")
+    )
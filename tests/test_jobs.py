@@ -1,14 +1,34 @@
 """"""
 
 # Standard library modules.
+import threading
+import subprocess
+import datetime
+import re
 
 # Third party modules.
 import pytest
+from django.apps import apps
+from django.db import connection
+from django.utils import timezone
 
 # Local modules.
 from django_cd.jobs import Job
-from django_cd.actions import Action
-from django_cd.models import JobRun, ActionRun, RunState
+from django_cd.metrics import render as render_metrics
+from django_cd.tasks import run_job, prune_jobs
+from django_cd import actions, jobs
+from django_cd.actions import Action, GitCheckoutAction
+from django_cd.models import (
+    JobRun,
+    ActionRun,
+    OutputChunk,
+    TestResult,
+    TriggerState,
+    RunState,
+)
+from django_cd.retention import RetentionPolicy, release_stale_jobruns
+from django_cd.scheduler import Scheduler
+from django_cd.triggers import CronTrigger, expand_hashed
 
 # Globals and constants variables.
 
@@ -22,6 +42,18 @@ class MockAction(Action):
         return self.state
 
 
+class BarrierAction(Action):
+    def __init__(self, name, barrier, needs=None, relpath=""):
+        super().__init__(name, relpath)
+        self.barrier = barrier
+        self.needs = needs
+
+    def _run(self, workdir, outputs, env):
+        self.barrier.wait()
+        env[self.name] = "done"
+        return RunState.SUCCESS
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize("state", [RunState.SUCCESS, RunState.FAILED, RunState.ERROR])
 def test_job_run(tmp_path, state):
@@ -40,3 +72,749 @@ def test_job_run(tmp_path, state):
     actionrun = ActionRun.objects.first()
     assert actionrun.name == "action"
     assert actionrun.state == state
+
+
+@pytest.mark.django_db(transaction=True)
+def test_job_run_needs(tmp_path):
+    barrier = threading.Barrier(2, timeout=10)
+    actions = [
+        MockAction(name="checkout", state=RunState.SUCCESS),
+        BarrierAction(name="lint", barrier=barrier, needs=["checkout"]),
+        BarrierAction(name="test", barrier=barrier, needs=["checkout"]),
+    ]
+    job = Job("test", tmp_path, actions=actions, max_workers=2)
+    job.run()
+
+    jobrun = JobRun.objects.first()
+    assert jobrun.state == RunState.SUCCESS
+
+    assert set(ActionRun.objects.values_list("name", "state")) == {
+        ("checkout", RunState.SUCCESS),
+        ("lint", RunState.SUCCESS),
+        ("test", RunState.SUCCESS),
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_job_run_needs_failfast(tmp_path):
+    action1 = MockAction(name="checkout", state=RunState.FAILED)
+    action1.needs = []
+    action2 = MockAction(name="test", state=RunState.SUCCESS)
+    action2.needs = ["checkout"]
+    job = Job("test", tmp_path, actions=[action1, action2])
+    job.run()
+
+    jobrun = JobRun.objects.first()
+    assert jobrun.state == RunState.FAILED
+
+    assert list(ActionRun.objects.values_list("name", flat=True)) == ["checkout"]
+
+
+def test_job_dependencies(tmp_path):
+    action1 = MockAction(name="a", state=RunState.SUCCESS)
+    action2 = MockAction(name="b", state=RunState.SUCCESS)
+    action3 = MockAction(name="c", state=RunState.SUCCESS)
+    action3.needs = ["a"]
+    job = Job("test", tmp_path, actions=[action1, action2, action3])
+
+    assert job.dependencies == {action1: (), action2: (action1,), action3: (action1,)}
+
+
+@pytest.mark.parametrize("needs", [["unknown"], ["b"]])
+def test_job_dependencies_invalid(tmp_path, needs):
+    action1 = MockAction(name="a", state=RunState.SUCCESS)
+    action1.needs = needs
+    action2 = MockAction(name="b", state=RunState.SUCCESS)
+
+    with pytest.raises(ValueError):
+        Job("test", tmp_path, actions=[action1, action2])
+
+
+def test_job_from_yaml_needs(tmp_path):
+    filepath = tmp_path.joinpath("job.yaml")
+    filepath.write_text("""
+name: test
+max_workers: 4
+actions:
+  - name: a
+    uses: command
+    args: echo a
+  - name: b
+    uses: command
+    args: echo b
+    needs: []
+  - name: c
+    uses: command
+    args: echo c
+    needs: [a, b]
+""")
+    job = Job.from_yaml(filepath)
+
+    a, b, c = job.actions
+    assert job.max_workers == 4
+    assert job.dependencies == {a: (), b: (), c: (a, b)}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_job_from_yaml_matrix(tmp_path):
+    filepath = tmp_path.joinpath("job.yaml")
+    filepath.write_text(f"""
+name: test
+workdir: {tmp_path}
+matrix:
+  python: ["3.9", "3.10"]
+  mode: [dev]
+actions:
+  - name: echo
+    uses: command
+    args: echo ${{python}} ${{mode}}
+""")
+    job = Job.from_yaml(filepath)
+
+    assert [variant.name for variant in job.variants] == [
+        "test (python=3.9, mode=dev)",
+        "test (python=3.10, mode=dev)",
+    ]
+    assert job.variants[0].workdir == tmp_path.joinpath("3.9-dev")
+    assert job.variants[0].actions[0].args == ["echo", "3.9", "dev"]
+
+    jobrun = job.run()
+
+    assert jobrun.state == RunState.SUCCESS
+    assert jobrun.children.count() == 2
+    assert JobRun.objects.filter(parent__isnull=True).count() == 1
+
+    child = jobrun.children.get(name="test (python=3.10, mode=dev)")
+    assert child.state == RunState.SUCCESS
+    assert "3.10 dev" in child.actionruns.get().output
+
+
+@pytest.mark.django_db
+def test_job_run_skip_unchanged(tmp_path):
+    reposdir = tmp_path.joinpath("upstream", "example")
+    reposdir.mkdir(parents=True)
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(git + ["init", "-b", "main"], cwd=reposdir, check=True)
+    subprocess.run(
+        git + ["commit", "--allow-empty", "-m", "1"], cwd=reposdir, check=True
+    )
+
+    workdir = tmp_path.joinpath("workdir")
+    workdir.mkdir()
+    action = GitCheckoutAction("checkout", str(reposdir), branch="main")
+    job = Job("test", workdir, actions=[action])
+
+    assert job.has_changes()
+    assert job.run(skip_unchanged=True) is not None
+
+    assert not job.has_changes()
+    assert job.run(skip_unchanged=True) is None
+    assert JobRun.objects.count() == 1
+
+    subprocess.run(
+        git + ["commit", "--allow-empty", "-m", "2"], cwd=reposdir, check=True
+    )
+    actions._ls_remote_cache.clear()
+
+    assert job.has_changes()
+    assert job.run(skip_unchanged=True) is not None
+    assert JobRun.objects.count() == 2
+
+
+def _create_jobrun(name, state, days_ago, parent=None):
+    jobrun = JobRun.objects.create(name=name, state=state, parent=parent)
+    started_on = timezone.now() - datetime.timedelta(days=days_ago)
+    JobRun.objects.filter(id=jobrun.id).update(started_on=started_on)
+
+    actionrun = ActionRun.objects.create(name="a", jobrun=jobrun, state=state)
+    OutputChunk.objects.create(actionrun=actionrun, offset=0, text="output\n")
+    TestResult.objects.create(
+        name="test",
+        actionrun=actionrun,
+        state=state,
+        duration=datetime.timedelta(seconds=1),
+    )
+    return jobrun
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "runs,days,expected",
+    [
+        (2, None, ["f0", "s1"]),
+        (None, 3.5, ["f0", "s1", "s2", "s3"]),
+        (1, 1.5, ["f0", "s1"]),
+    ],
+)
+def test_job_prune(tmp_path, runs, days, expected):
+    jobruns = {
+        "r": _create_jobrun("test", RunState.RUNNING, 10),
+        "f0": _create_jobrun("test", RunState.FAILED, 0),
+        "s1": _create_jobrun("test", RunState.SUCCESS, 1),
+        "s2": _create_jobrun("test", RunState.SUCCESS, 2),
+        "s3": _create_jobrun("test", RunState.SUCCESS, 3),
+        "s4": _create_jobrun("test", RunState.SUCCESS, 4),
+    }
+    _create_jobrun("test (x=1)", RunState.SUCCESS, 4, parent=jobruns["s4"])
+    other = _create_jobrun("other", RunState.SUCCESS, 10)
+
+    # Reused action run outside retention
+    cached = jobruns["f0"].actionruns.get()
+    cached.cached_from = jobruns["s4"].actionruns.get()
+    cached.save()
+
+    job = Job("test", tmp_path, retention=RetentionPolicy(runs, days))
+    job.prune()
+
+    names = {jobrun.id: name for name, jobrun in jobruns.items()}
+    remaining = JobRun.objects.filter(name="test").values_list("id", flat=True)
+    assert sorted(names[id] for id in remaining) == sorted(expected + ["r"])
+
+    assert JobRun.objects.filter(name="test (x=1)").count() == 0
+    assert JobRun.objects.filter(id=other.id).exists()
+    assert ActionRun.objects.count() == len(expected) + 2
+    assert OutputChunk.objects.count() == len(expected) + 2
+    assert TestResult.objects.count() == len(expected) + 2
+
+    cached.refresh_from_db()
+    assert cached.cached_from is None
+
+
+@pytest.mark.django_db
+def test_prune_jobs(tmp_path, registry):
+    registry["a"] = Job("a", tmp_path, retention=RetentionPolicy(runs=1))
+    registry["b"] = Job("b", tmp_path)
+    for name in ["a", "b"]:
+        for _ in range(3):
+            JobRun.objects.create(name=name, state=RunState.SUCCESS)
+
+    prune_jobs()
+    prune_jobs()
+
+    assert JobRun.objects.filter(name="a").count() == 1
+    assert JobRun.objects.filter(name="b").count() == 3
+
+
+@pytest.mark.django_db
+def test_job_prune_keeps_last_success_and_failure(tmp_path):
+    success = _create_jobrun("test", RunState.SUCCESS, 3)
+    failure = _create_jobrun("test", RunState.ERROR, 2)
+    _create_jobrun("test", RunState.FAILED, 1)
+    _create_jobrun("test", RunState.SKIPPED, 0)
+
+    job = Job("test", tmp_path, retention=RetentionPolicy(runs=1))
+    job.prune()
+
+    assert set(JobRun.objects.values_list("state", flat=True)) == {
+        RunState.SUCCESS,
+        RunState.FAILED,
+        RunState.SKIPPED,
+    }
+    assert not JobRun.objects.filter(id=failure.id).exists()
+    assert JobRun.objects.filter(id=success.id).exists()
+
+
+def test_job_from_yaml_retention(tmp_path):
+    filepath = tmp_path.joinpath("job.yaml")
+    filepath.write_text("""
+name: test
+retention:
+  runs: 20
+  days: 30
+""")
+    job = Job.from_yaml(filepath)
+
+    assert job.retention.runs == 20
+    assert job.retention.days == 30
+
+
+@pytest.mark.parametrize("runs,days", [(None, None), (0, None), (None, -1)])
+def test_retention_policy_invalid(runs, days):
+    with pytest.raises(ValueError):
+        RetentionPolicy(runs, days)
+
+
+@pytest.mark.django_db
+def test_job_run_metrics(tmp_path, registry):
+    job = Job("test", tmp_path, actions=[MockAction("a", RunState.FAILED)])
+    registry[job.name] = job
+    run_job(job.name, scheduled_on=timezone.now())
+
+    lines = render_metrics().splitlines()
+    assert 'djangocd_job_runs_total{job="test",state="failed"} 1' in lines
+    assert 'djangocd_job_duration_seconds_count{job="test"} 1' in lines
+    assert "djangocd_jobs_running 0" in lines
+    assert 'djangocd_action_runs_total{job="test",action="a",state="failed"} 1' in lines
+    assert 'djangocd_action_duration_seconds_count{job="test",action="a"} 1' in lines
+    assert "djangocd_schedule_latency_seconds_count 1" in lines
+
+
+class ResultsAction(Action):
+    def __init__(self, name, testresults, relpath=""):
+        super().__init__(name, relpath)
+        self.testresults = testresults
+
+    def _run(self, workdir, outputs, env):
+        self.add_testresults(
+            [
+                (f"test{i}", state, datetime.timedelta(seconds=1), None)
+                for i, state in enumerate(self.testresults)
+            ]
+        )
+        return RunState.SUCCESS
+
+
+class SharedBarrierAction(ResultsAction):
+    # Class attribute, shared by the copies of the job
+    barrier = None
+
+    def _run(self, workdir, outputs, env):
+        self.barrier.wait()
+        return super()._run(workdir, outputs, env)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_job_concurrently(tmp_path, registry, monkeypatch):
+    monkeypatch.setattr(
+        SharedBarrierAction, "barrier", threading.Barrier(2, timeout=10)
+    )
+    action = SharedBarrierAction("a", [RunState.SUCCESS, RunState.FAILED])
+    registry["test"] = Job("test", tmp_path, actions=[action])
+
+    def run():
+        try:
+            run_job("test")
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Each run has its own test results
+    for actionrun in ActionRun.objects.all():
+        assert actionrun.testresults.count() == 2
+        assert actionrun.tests_total == 2
+    assert ActionRun.objects.count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_job_run_test_counters(tmp_path):
+    actions = [
+        ResultsAction("a", [RunState.SUCCESS, RunState.FAILED]),
+        ResultsAction("b", [RunState.SUCCESS, RunState.SKIPPED, RunState.ERROR]),
+    ]
+    variant = Job("test (x=1)", tmp_path, actions=actions)
+    job = Job("test", tmp_path, variants=[variant])
+    jobrun = job.run()
+
+    child = jobrun.children.get()
+    for run in [jobrun, child]:
+        assert run.tests_passed == 2
+        assert run.tests_failed == 1
+        assert run.tests_error == 1
+        assert run.tests_skipped == 1
+        assert run.tests_duration == datetime.timedelta(seconds=5)
+
+
+@pytest.mark.django_db
+def test_run_job_by_name(tmp_path, settings, registry):
+    filepath = tmp_path.joinpath("job.yaml")
+    filepath.write_text(f"""
+name: test
+workdir: {tmp_path}
+actions:
+  - name: echo
+    uses: command
+    args: echo first
+""")
+    settings.JOBFILES = [filepath]
+    job = apps.get_app_config("django_cd").reload_jobs()["test"]
+
+    # Only the name and digest are enqueued
+    message = settings.HUEY.serialize_task(run_job.s(job.name, job.digest))
+    assert len(message) < 512
+
+    # Job file changed since enqueue, the worker reloads its definition
+    filepath.write_text(filepath.read_text().replace("first", "second"))
+    digest = Job.from_yaml(filepath).digest
+    assert digest != job.digest
+
+    run_job(job.name, digest)
+    assert "second" in ActionRun.objects.get().output
+
+    # Unknown job
+    run_job("unknown")
+    assert JobRun.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_scheduler(tmp_path, registry):
+    for name, expr in [("hourly", "0 * * * *"), ("daily", "30 2 * * *")]:
+        registry[name] = Job(
+            name,
+            tmp_path,
+            actions=[MockAction("a", RunState.SUCCESS)],
+            triggers=[CronTrigger(expr)],
+        )
+
+    now = datetime.datetime(2026, 1, 1, 1, 15, tzinfo=datetime.timezone.utc)
+    scheduler = Scheduler()
+    scheduler.load(registry.values(), now)
+    assert len(scheduler) == 2
+    assert scheduler.nextrun == now.replace(hour=2, minute=0)
+    assert scheduler.timeout(now) == 60.0
+
+    assert scheduler.run_pending(now) == []
+    assert JobRun.objects.count() == 0
+
+    # Late by more than one hour, only one run of the hourly job
+    now = now.replace(hour=3, minute=5)
+    assert scheduler.run_pending(now) == [
+        ("hourly", now.replace(hour=2, minute=0)),
+        ("daily", now.replace(hour=2, minute=30)),
+    ]
+    assert JobRun.objects.filter(name="hourly").count() == 1
+    assert JobRun.objects.filter(name="daily").count() == 1
+    assert scheduler.nextrun == now.replace(hour=4, minute=0)
+
+    state = TriggerState.objects.get(name="hourly")
+    assert state.trigger == "cron (0 * * * *)"
+    assert state.fired_on == now.replace(hour=2, minute=0)
+
+
+@pytest.mark.django_db
+def test_scheduler_enqueue_error(tmp_path, registry, monkeypatch):
+    for name in ["a", "b"]:
+        registry[name] = Job(name, tmp_path, triggers=[CronTrigger("0 * * * *")])
+
+    def enqueue(*args):
+        raise ConnectionError("broker unreachable")
+
+    monkeypatch.setattr(registry["a"], "enqueue", enqueue)
+
+    now = datetime.datetime(2026, 1, 1, 1, 15, tzinfo=datetime.timezone.utc)
+    scheduler = Scheduler()
+    scheduler.load(registry.values(), now)
+
+    # Other triggers still fire and the failed one is rescheduled
+    now = now.replace(hour=2, minute=0)
+    assert scheduler.run_pending(now) == [("b", now)]
+    assert scheduler.nextrun == now.replace(hour=3)
+    assert not TriggerState.objects.filter(name="a").exists()
+
+
+@pytest.mark.django_db
+def test_scheduler_restart(tmp_path, registry):
+    trigger = CronTrigger("0 * * * *")
+    job = Job("test", tmp_path, triggers=[trigger])
+    fired_on = datetime.datetime(2026, 1, 1, 1, 0, tzinfo=datetime.timezone.utc)
+    TriggerState.objects.create(name=job.name, trigger=str(trigger), fired_on=fired_on)
+
+    # Missed fires are coalesced into one at startup
+    now = fired_on.replace(hour=4, minute=10)
+    scheduler = Scheduler()
+    scheduler.load([job], now)
+    assert scheduler.nextrun == now
+
+    # No fire missed
+    now = fired_on.replace(minute=10)
+    scheduler.load([job], now)
+    assert scheduler.nextrun == fired_on.replace(hour=2)
+
+
+def test_cron_trigger_nextrun(monkeypatch):
+    now = datetime.datetime(2026, 1, 1, 1, 15, tzinfo=datetime.timezone.utc)
+    monkeypatch.setattr(timezone, "now", lambda: now)
+
+    trigger = CronTrigger("0 * * * *")
+    assert trigger.nextrun == now.replace(hour=2, minute=0)
+
+    calls = []
+    next_after = trigger.next_after
+    monkeypatch.setattr(
+        trigger, "next_after", lambda dt: calls.append(dt) or next_after(dt)
+    )
+
+    # Memoized until it passes
+    now = now.replace(minute=59)
+    assert trigger.nextrun == now.replace(hour=2, minute=0)
+    assert calls == []
+
+    now = now.replace(hour=2, minute=0)
+    assert trigger.nextrun == now.replace(hour=3)
+    assert calls == [now]
+
+
+def test_cron_trigger_invalid():
+    with pytest.raises(ValueError):
+        CronTrigger("0 * *")
+
+
+def test_nextruns(tmp_path, monkeypatch, registry):
+    now = datetime.datetime(2026, 1, 1, 1, 15, tzinfo=datetime.timezone.utc)
+    monkeypatch.setattr(timezone, "now", lambda: now)
+
+    registry["hourly"] = Job("hourly", tmp_path, triggers=[CronTrigger("0 * * * *")])
+    registry["manual"] = Job("manual", tmp_path)
+    app = apps.get_app_config("django_cd")
+
+    nextruns = app.nextruns
+    assert nextruns == {"hourly": now.replace(hour=2, minute=0), "manual": None}
+    assert app.nextruns is nextruns
+
+    now = now.replace(hour=2, minute=0)
+    assert app.nextruns == {"hourly": now.replace(hour=3), "manual": None}
+
+
+@pytest.mark.parametrize(
+    "expr,pattern",
+    [
+        ("H * * * *", r"^(\d+) \* \* \* \*$"),
+        ("H(10-19) H * * 1-5", r"^(1\d) (\d+) \* \* 1-5$"),
+        ("H/15 * * * *", r"^(\d+)-59/15 \* \* \* \*$"),
+        ("0,H * * * *", r"^0,(\d+) \* \* \* \*$"),
+        ("0 * * * *", r"^0 \* \* \* \*$"),
+    ],
+)
+def test_expand_hashed(expr, pattern):
+    expanded = expand_hashed(expr, "test")
+    assert re.match(pattern, expanded)
+    assert expand_hashed(expr, "test") == expanded
+
+
+def test_cron_trigger_hashed(tmp_path):
+    minutes = set()
+    for i in range(10):
+        job = Job(f"job{i}", tmp_path, triggers=[CronTrigger("H * * * *")])
+        (trigger,) = job.triggers
+        minutes.add(trigger.nextrun.minute)
+
+        assert trigger.nextrun.second == 0
+        assert (
+            Job(job.name, tmp_path, triggers=[CronTrigger("H * * * *")]).nextrun
+            == job.nextrun
+        )
+
+    assert len(minutes) > 1
+
+
+def test_cron_trigger_spread(tmp_path):
+    now = datetime.datetime(2026, 1, 1, 1, 15, tzinfo=datetime.timezone.utc)
+
+    offsets = set()
+    for i in range(10):
+        job = Job(f"job{i}", tmp_path, triggers=[CronTrigger("0 * * * *", spread=10)])
+        (trigger,) = job.triggers
+        offset = trigger.next_after(now) - now.replace(hour=2, minute=0)
+        assert datetime.timedelta(0) <= offset < datetime.timedelta(minutes=10)
+        offsets.add(offset)
+
+        # Hourly, whatever the offset
+        fire_on = trigger.next_after(now)
+        assert trigger.next_after(fire_on) - fire_on == datetime.timedelta(hours=1)
+
+    assert len(offsets) > 1
+    assert str(trigger) == "cron (0 * * * *, spread 10 min)"
+
+    with pytest.raises(ValueError):
+        CronTrigger("0 * * * *", spread=-1)
+
+
+def _execute_all(huey):
+    # Worker closes database connections, not wanted within a test
+    while huey.pending_count():
+        task = huey.dequeue()
+        if not huey.ready_to_run(task):
+            huey.add_schedule(task)
+            continue
+        run_job.call_local(*task.args, **task.kwargs)
+
+
+@pytest.mark.django_db
+def test_job_enqueue(tmp_path, registry, queue):
+    job = Job("test", tmp_path, actions=[MockAction("a", RunState.SUCCESS)])
+    registry[job.name] = job
+
+    jobruns = [job.enqueue(), job.enqueue()]
+    assert [jobrun.state for jobrun in jobruns] == [RunState.PENDING] * 2
+    assert queue.pending_count() == 2
+
+    _execute_all(queue)
+    for jobrun in jobruns:
+        jobrun.refresh_from_db()
+        assert jobrun.state == RunState.SUCCESS
+        assert jobrun.concurrency_key is None
+
+
+@pytest.mark.django_db
+def test_job_enqueue_queue_one(tmp_path, registry, queue):
+    job = Job("test", tmp_path, concurrency="queue-one")
+    registry[job.name] = job
+
+    jobrun = job.enqueue()
+    assert job.enqueue() is None
+
+    # Another run can be queued once the pending one started
+    assert job._start_pending(jobrun)
+    assert job.enqueue() is not None
+    assert job.enqueue() is None
+    assert JobRun.objects.filter(state=RunState.PENDING).count() == 1
+
+
+@pytest.mark.django_db
+def test_job_enqueue_skip_if_running(tmp_path, registry, queue):
+    job = Job(
+        "test",
+        tmp_path,
+        actions=[MockAction("a", RunState.SUCCESS)],
+        concurrency="skip-if-running",
+    )
+    registry[job.name] = job
+
+    jobrun = job.enqueue()
+    assert job.enqueue() is None
+
+    # Released once the run finished
+    _execute_all(queue)
+    jobrun.refresh_from_db()
+    assert jobrun.state == RunState.SUCCESS
+    assert jobrun.concurrency_key is None
+
+    jobrun = job.enqueue()
+    assert job._start_pending(jobrun)
+    assert job.enqueue() is None
+
+
+@pytest.mark.django_db
+def test_job_enqueue_cancel_previous(tmp_path, registry, queue):
+    job = Job(
+        "test",
+        tmp_path,
+        actions=[MockAction("a", RunState.SUCCESS)],
+        concurrency="cancel-previous",
+    )
+    registry[job.name] = job
+
+    previous = job.enqueue()
+    jobrun = job.enqueue()
+
+    previous.refresh_from_db()
+    assert previous.state == RunState.SKIPPED
+    assert jobrun.state == RunState.PENDING
+
+    # Task of the cancelled run does nothing
+    _execute_all(queue)
+    previous.refresh_from_db()
+    assert previous.state == RunState.SKIPPED
+    assert ActionRun.objects.get().jobrun_id == jobrun.id
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("concurrency", ["queue-one", "cancel-previous"])
+def test_job_enqueue_while_running(tmp_path, registry, queue, concurrency):
+    job = Job(
+        "test",
+        tmp_path,
+        actions=[MockAction("a", RunState.SUCCESS)],
+        concurrency=concurrency,
+    )
+    registry[job.name] = job
+
+    running = job.enqueue()
+    queue.dequeue()
+    assert job._start_pending(running)
+
+    # Pending run waits for the running one to finish
+    jobrun = job.enqueue()
+    _execute_all(queue)
+    jobrun.refresh_from_db()
+    assert jobrun.state == RunState.PENDING
+    assert ActionRun.objects.count() == 0
+    assert queue.scheduled_count() == 1
+
+    job._finish(running, {RunState.SUCCESS}, 0.0)
+    task = queue.read_schedule(datetime.datetime.max)[0]
+    run_job.call_local(*task.args, **task.kwargs)
+    jobrun.refresh_from_db()
+    assert jobrun.state == RunState.SUCCESS
+    assert jobrun.concurrency_key is None
+
+
+@pytest.mark.django_db
+def test_job_enqueue_skip_unchanged(tmp_path, registry, monkeypatch):
+    job = Job("test", tmp_path, concurrency="queue-one")
+    registry[job.name] = job
+    monkeypatch.setattr(job, "has_changes", lambda: False)
+
+    # Pending run is removed when the job is skipped
+    job.enqueue(skip_unchanged=True)
+    assert JobRun.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_job_enqueue_error(tmp_path, monkeypatch):
+    job = Job("test", tmp_path, concurrency="queue-one")
+
+    def run_job(*args):
+        raise ConnectionError("broker unreachable")
+
+    monkeypatch.setattr(jobs, "run_job", run_job)
+    with pytest.raises(ConnectionError):
+        job.enqueue()
+
+    # Pending run is removed, so it does not block the job
+    assert JobRun.objects.count() == 0
+    assert job._create_pending() is not None
+
+
+@pytest.mark.django_db
+def test_job_run_error(tmp_path, registry, monkeypatch):
+    job = Job("test", tmp_path, concurrency="skip-if-running")
+    registry[job.name] = job
+
+    def fail(*args):
+        raise RuntimeError("worker failure")
+
+    monkeypatch.setattr(Job, "_run_actions_sequentially", fail)
+    jobrun = job._create_pending()
+    with pytest.raises(RuntimeError):
+        run_job.call_local(job.name, jobrun_id=jobrun.id)
+
+    jobrun.refresh_from_db()
+    assert jobrun.state == RunState.ERROR
+    assert jobrun.concurrency_key is None
+
+    # Run failing before it started
+    monkeypatch.setattr(Job, "has_changes", fail)
+    jobrun = job._create_pending()
+    with pytest.raises(RuntimeError):
+        run_job.call_local(job.name, skip_unchanged=True, jobrun_id=jobrun.id)
+
+    jobrun.refresh_from_db()
+    assert jobrun.state == RunState.ERROR
+    assert jobrun.concurrency_key is None
+
+
+@pytest.mark.django_db
+def test_release_stale_jobruns(tmp_path):
+    job = Job("test", tmp_path, concurrency="skip-if-running")
+    stale = job._create_pending()
+    JobRun.objects.filter(pk=stale.pk).update(
+        started_on=timezone.now() - datetime.timedelta(days=2)
+    )
+
+    assert release_stale_jobruns(3600) == 1
+    assert job._create_pending() is not None
+    assert release_stale_jobruns(3600) == 0
+
+    stale.refresh_from_db()
+    assert stale.state == RunState.ERROR
+    assert stale.concurrency_key is None
+
+
+def test_job_invalid_concurrency(tmp_path):
+    with pytest.raises(ValueError):
+        Job("test", tmp_path, concurrency="queue-all")
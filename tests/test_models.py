@@ -0,0 +1,98 @@
+""""""
+
+# Standard library modules.
+import datetime
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from django_cd.models import JobRun, ActionRun, OutputChunk, TestResult, RunState
+from django_cd.fields import compress, decompress, HEADER_RAW, HEADER_ZLIB
+
+# Globals and constants variables.
+
+
+@pytest.fixture
+def actionrun():
+    jobrun = JobRun.objects.create(name="test")
+    actionrun = ActionRun.objects.create(name="action", jobrun=jobrun)
+    OutputChunk.objects.create(actionrun=actionrun, offset=0, text="abc\n")
+    OutputChunk.objects.create(actionrun=actionrun, offset=4, text="def\n")
+    OutputChunk.objects.create(actionrun=actionrun, offset=8, text="ghi\n")
+    return actionrun
+
+
+@pytest.mark.django_db
+def test_actionrun_output(actionrun):
+    assert actionrun.output == "abc\ndef\nghi\n"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "offset,expected",
+    [
+        (0, "abc\ndef\nghi\n"),
+        (4, "def\nghi\n"),
+        (6, "f\nghi\n"),
+        (12, ""),
+        (20, ""),
+    ],
+)
+def test_actionrun_read_output(actionrun, offset, expected):
+    text, newoffset = actionrun.read_output(offset)
+    assert text == expected
+    assert newoffset == max(offset, 12)
+
+
+@pytest.mark.django_db
+def test_actionrun_read_output_empty():
+    jobrun = JobRun.objects.create(name="test")
+    actionrun = ActionRun.objects.create(name="action", jobrun=jobrun)
+    assert actionrun.read_output(0) == ("", 0)
+
+
+@pytest.mark.parametrize(
+    "text,header",
+    [("", HEADER_RAW), ("short", HEADER_RAW), ("pip install\n" * 100, HEADER_ZLIB)],
+)
+def test_compress(text, header):
+    value = compress(text)
+    assert value[:1] == header
+    assert decompress(value) == text
+
+
+def test_decompress_unknown_header():
+    with pytest.raises(ValueError):
+        decompress(b"\x7fabc")
+
+
+@pytest.mark.django_db
+def test_testresult_output_compressed(actionrun):
+    output = "Traceback (most recent call last):\n" * 100
+    TestResult.objects.create(
+        name="test",
+        actionrun=actionrun,
+        state=RunState.FAILED,
+        duration=datetime.timedelta(seconds=1),
+        output=output,
+    )
+    TestResult.objects.create(
+        name="test2",
+        actionrun=actionrun,
+        state=RunState.SUCCESS,
+        duration=datetime.timedelta(seconds=1),
+    )
+
+    stored = bytes(
+        TestResult.objects.filter(name="test").values_list("output", flat=True).get()
+    )
+    assert stored[:1] == HEADER_ZLIB
+    assert len(stored) < len(output)
+
+    testresult = TestResult.objects.get(name="test")
+    assert isinstance(testresult.__dict__["output"], (bytes, memoryview))
+    assert testresult.output == output
+    assert testresult.__dict__["output"] == output
+
+    assert TestResult.objects.get(name="test2").output is None
@@ -0,0 +1,302 @@
+""""""
+
+# Standard library modules.
+import datetime
+
+# Third party modules.
+import pytest
+from django.test import RequestFactory
+from django.core.cache import cache
+from django.utils import timezone
+
+# Local modules.
+from django_cd import views, metrics
+from django_cd.jobs import Job
+from django_cd.retention import RetentionPolicy
+from django_cd.actions import store_artifact
+from django_cd.models import (
+    JobRun,
+    ActionRun,
+    ActionSpan,
+    Artifact,
+    OutputChunk,
+    RunState,
+    TestResult,
+)
+from django_cd.templatetags.djangocd_extras import waterfall
+from django_cd.triggers import CronTrigger
+
+# Globals and constants variables.
+DURATION = datetime.timedelta(seconds=1)
+
+
+@pytest.fixture
+def artifact(tmp_path, settings):
+    settings.CACHEDIR = tmp_path.joinpath("cache")
+    filepath = tmp_path.joinpath("data.bin")
+    filepath.write_bytes(bytes(range(100)))
+    digest, size = store_artifact(filepath)
+
+    jobrun = JobRun.objects.create(name="test")
+    actionrun = ActionRun.objects.create(name="action", jobrun=jobrun)
+    return Artifact.objects.create(
+        actionrun=actionrun, path="dist/data.bin", digest=digest, size=size
+    )
+
+
+@pytest.mark.django_db
+def test_artifact(artifact):
+    request = RequestFactory().get("/")
+    response = views.artifact(request, artifact.id)
+
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == bytes(range(100))
+    assert response["ETag"] == f'"{artifact.digest}"'
+    assert "data.bin" in response["Content-Disposition"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "range,expected_content_range,expected",
+    [
+        ("bytes=10-19", "bytes 10-19/100", bytes(range(10, 20))),
+        ("bytes=90-", "bytes 90-99/100", bytes(range(90, 100))),
+        ("bytes=-5", "bytes 95-99/100", bytes(range(95, 100))),
+        ("bytes=95-200", "bytes 95-99/100", bytes(range(95, 100))),
+    ],
+)
+def test_artifact_range(artifact, range, expected_content_range, expected):
+    request = RequestFactory().get("/", HTTP_RANGE=range)
+    response = views.artifact(request, artifact.id)
+
+    assert response.status_code == 206
+    assert response["Content-Range"] == expected_content_range
+    assert b"".join(response.streaming_content) == expected
+
+
+@pytest.mark.django_db
+def test_artifact_range_not_satisfiable(artifact):
+    request = RequestFactory().get("/", HTTP_RANGE="bytes=200-")
+    response = views.artifact(request, artifact.id)
+    assert response.status_code == 416
+
+
+@pytest.mark.django_db
+def test_artifact_not_modified(artifact):
+    request = RequestFactory().get("/", HTTP_IF_NONE_MATCH=f'"{artifact.digest}"')
+    response = views.artifact(request, artifact.id)
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_waterfall():
+    jobrun = JobRun.objects.create(name="test")
+    actionrun = ActionRun.objects.create(
+        name="action", jobrun=jobrun, duration=datetime.timedelta(seconds=4)
+    )
+    span = ActionSpan.objects.create(
+        actionrun=actionrun,
+        name="clean",
+        started_on=actionrun.started_on + datetime.timedelta(seconds=1),
+        duration=datetime.timedelta(seconds=2),
+    )
+
+    assert waterfall(actionrun) == [(span, 25.0, 50.0)]
+
+    # Running action, relative to the last span
+    actionrun.duration = None
+    assert waterfall(actionrun) == [
+        (span, pytest.approx(100 / 3), pytest.approx(200 / 3))
+    ]
+
+
+@pytest.mark.django_db
+def test_metrics():
+    metrics.inc(metrics.JOB_RUNS, {"job": 'a "quoted" job', "state": "success"})
+    metrics.inc(metrics.JOB_RUNS, {"job": 'a "quoted" job', "state": "success"})
+    metrics.observe(metrics.JOB_DURATION, 12.5, {"job": "a"}, buckets=(5, 15, 60))
+    metrics.observe(metrics.JOB_DURATION, 30, {"job": "a"}, buckets=(5, 15, 60))
+
+    request = RequestFactory().get("/metrics")
+    response = views.metrics(request)
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == metrics.CONTENT_TYPE
+
+    lines = response.content.decode("utf8").splitlines()
+    assert "# TYPE djangocd_job_runs_total counter" in lines
+    assert (
+        'djangocd_job_runs_total{job="a \\"quoted\\" job",state="success"} 2' in lines
+    )
+    assert "djangocd_jobs_running 0" in lines
+
+    start = lines.index('djangocd_job_duration_seconds_bucket{job="a",le="5"} 0')
+    assert lines[start : start + 6] == [
+        'djangocd_job_duration_seconds_bucket{job="a",le="5"} 0',
+        'djangocd_job_duration_seconds_bucket{job="a",le="15"} 1',
+        'djangocd_job_duration_seconds_bucket{job="a",le="60"} 2',
+        'djangocd_job_duration_seconds_bucket{job="a",le="+Inf"} 2',
+        'djangocd_job_duration_seconds_count{job="a"} 2',
+        'djangocd_job_duration_seconds_sum{job="a"} 42.5',
+    ]
+    assert "# TYPE djangocd_queue_pending gauge" in lines
+    assert "djangocd_queue_pending 0" in lines
+
+
+@pytest.mark.django_db
+def test_metrics_textfile(tmp_path):
+    jobrun = JobRun.objects.create(name="a", state=RunState.RUNNING)
+    JobRun.objects.create(name="a (x=1)", state=RunState.RUNNING, parent=jobrun)
+    JobRun.objects.create(name="b", state=RunState.SUCCESS)
+
+    filepath = tmp_path.joinpath("djangocd.prom")
+    metrics.write_textfile(filepath)
+
+    assert "djangocd_jobs_running 1\n" in filepath.read_text()
+    assert list(tmp_path.iterdir()) == [filepath]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("nruns", [1, 15])
+def test_jobruns_context(nruns, django_assert_num_queries):
+    for i in range(nruns):
+        jobrun = JobRun.objects.create(name="a", state=RunState.SUCCESS)
+        JobRun.objects.create(name="a (x=1)", parent=jobrun)
+    latest = JobRun.objects.create(name="b", state=RunState.FAILED)
+
+    request = RequestFactory().get("/jobruns", {"njobs": "10"})
+    with django_assert_num_queries(1):
+        context = views._create_jobruns_context(request)
+
+    assert context["njobs"] == 10
+    assert [row[0] for row in context["rows"]] == ["b", "a"]
+
+    name, runs, nextrun = context["rows"][0]
+    assert [run.id if run else None for run in runs] == [latest.id] + [None] * 9
+
+    name, runs, nextrun = context["rows"][1]
+    ids = list(
+        JobRun.objects.filter(name="a").order_by("-id").values_list("id", flat=True)
+    )
+    assert [run.id for run in runs if run] == ids[:10]
+    assert len(runs) == 10
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("nactions", [1, 10])
+def test_jobrun(nactions, django_assert_num_queries):
+    jobrun = JobRun.objects.create(name="test")
+    JobRun.objects.create(name="test (x=1)", parent=jobrun)
+    previous = None
+    for i in range(nactions):
+        actionrun = ActionRun.objects.create(
+            name=f"action{i}",
+            jobrun=jobrun,
+            cached_from=previous,
+            tests_passed=1,
+            tests_failed=1,
+        )
+        TestResult.objects.create(
+            name="a", actionrun=actionrun, state=RunState.SUCCESS, duration=DURATION
+        )
+        TestResult.objects.create(
+            name="b", actionrun=actionrun, state=RunState.FAILED, duration=DURATION
+        )
+        ActionSpan.objects.create(
+            actionrun=actionrun,
+            name="span",
+            started_on=actionrun.started_on,
+            duration=DURATION,
+        )
+        OutputChunk.objects.create(actionrun=actionrun, offset=0, text="output\n")
+        previous = actionrun
+
+    request = RequestFactory().get(f"/jobruns/{jobrun.id}")
+    with django_assert_num_queries(6):
+        response = views.jobrun(request, jobrun.id)
+
+    assert response.status_code == 200
+    content = response.content.decode("utf8")
+    assert content.count("1 succeeded, 1 failed") == nactions
+    assert content.count("Reused from") == nactions - 1
+
+
+@pytest.mark.django_db
+def test_jobruns_conditional(django_assert_num_queries):
+    cache.clear()
+    jobrun = JobRun.objects.create(name="test", state=RunState.SUCCESS)
+
+    response = views.jobruns(RequestFactory().get("/jobruns"))
+    assert response.status_code == 200
+    assert "no-cache" in response["Cache-Control"]
+    assert f"/jobruns/{jobrun.id}" in response.content.decode("utf8")
+    etag = response["ETag"]
+
+    # Unchanged, without touching the database
+    with django_assert_num_queries(0):
+        response = views.jobruns(
+            RequestFactory().get("/jobruns", HTTP_IF_NONE_MATCH=etag)
+        )
+        assert response.status_code == 304
+
+        response = views.jobruns(RequestFactory().get("/jobruns"))
+        assert response.status_code == 200
+
+    # Changed
+    jobrun.state = RunState.FAILED
+    jobrun.save()
+
+    response = views.jobruns(RequestFactory().get("/jobruns", HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_jobruns_invalidated_by_prune(tmp_path):
+    cache.clear()
+    JobRun.objects.create(name="test", state=RunState.SUCCESS)
+    JobRun.objects.create(name="test", state=RunState.SUCCESS)
+    etag = views.jobruns(RequestFactory().get("/jobruns"))["ETag"]
+
+    Job("test", tmp_path, retention=RetentionPolicy(runs=1)).prune()
+
+    response = views.jobruns(RequestFactory().get("/jobruns", HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_forecast_context(monkeypatch, registry, tmp_path):
+    now = datetime.datetime(2026, 1, 1, 0, 50, tzinfo=datetime.timezone.utc)
+    monkeypatch.setattr(timezone, "now", lambda: now)
+
+    registry["a"] = Job("a", tmp_path, triggers=[CronTrigger("0 * * * *")])
+    registry["b"] = Job("b", tmp_path, triggers=[CronTrigger("20 * * * *")])
+    registry["c"] = Job("c", tmp_path)
+    for minutes in [20, 40]:
+        JobRun.objects.create(name="a", duration=datetime.timedelta(minutes=minutes))
+
+    request = RequestFactory().get("/forecast", {"hours": "2"})
+    context = views._create_forecast_context(request)
+
+    assert context["hours"] == 2
+    assert context["rows"] == [
+        ["a", registry["a"].triggers, datetime.timedelta(minutes=30), 2],
+        ["b", registry["b"].triggers, None, 2],
+    ]
+
+    # Runs of a (30 min) overlap with b, which was never run
+    assert context["peak"] == 2
+    times = [time for time, names in context["load"] if len(names) == 2]
+    assert times == [
+        now.replace(hour=1, minute=20),
+        now.replace(hour=2, minute=20),
+    ]
+
+
+@pytest.mark.django_db
+def test_metrics_queue_pending_dict_setting(settings):
+    # djhuey also accepts a dict, the configured instance is used regardless
+    settings.HUEY = {"name": "test", "immediate": True}
+
+    lines = metrics.render().splitlines()
+    assert "djangocd_queue_pending 0" in lines
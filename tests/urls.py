@@ -0,0 +1,14 @@
+""""""
+
+# Standard library modules.
+
+# Third party modules.
+from django.urls import path, include
+
+# Local modules.
+
+# Globals and constants variables.
+
+urlpatterns = [
+    path("", include("django_cd.urls")),
+]